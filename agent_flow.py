@@ -1,65 +1,187 @@
-from langgraph.graph import StateGraph, END
+from langgraph.graph import StateGraph, START, END
 from langgraph.pregel import Pregel
+import threading
 from typing import TypedDict, Optional, Dict, Any
 from load_contracts import get_procurement_summary, get_procurement_structured_data
 from scenario_planning import get_scenario_summary, get_scenario_structured_data
 from sku_rationalization import get_sku_summary, get_sku_structured_data
+from instrumentation import span, traced
 
 # === Define Enhanced Shared State ===
 class AgentState(TypedDict):
-    # Text summaries
+    # Text summaries, filled in by the narrative phase
     scenario_summary: Optional[str]
     sku_summary: Optional[str]
     procurement_summary: Optional[str]
     demand_change: Optional[float]
+    stream_insights: Optional[bool]
     
     # Structured data for visualizations
     sku_structured_data: Optional[Dict[str, Any]]
     scenario_structured_data: Optional[Dict[str, Any]]
     procurement_structured_data: Optional[Dict[str, Any]]
 
+    final_dashboard: Optional[str]
+
+# Phase 1 nodes compute only the deterministic numbers, so charts never wait on the LLM.
+# Narratives are generated afterwards by a NarrativeJob (see below).
+
 # === Node 1: Procurement Analysis ===
+@traced("node.procurement")
 def procurement_node(state: AgentState) -> AgentState:
-    summary = get_procurement_summary()
-    structured_data = get_procurement_structured_data()  # Use the new function
-    
-    return {
-        **state, 
-        "procurement_summary": "📑 Procurement Summary:\n" + summary,
-        "procurement_structured_data": structured_data
-    }
+    # Nodes return only the keys they own so parallel branches never collide
+    return {"procurement_structured_data": get_procurement_structured_data()}
 
 # === Node 2: Scenario Planning Analysis ===
+@traced("node.scenario")
 def scenario_node(state: AgentState) -> AgentState:
     demand_change = state.get('demand_change', -15)
-    summary = get_scenario_summary(demand_change)
-    structured_data = get_scenario_structured_data(demand_change)  # Use the new function
-    
-    return {
-        **state, 
-        "scenario_summary": "📈 Scenario Planning Summary:\n" + summary,
-        "scenario_structured_data": structured_data
-    }
+    return {"scenario_structured_data": get_scenario_structured_data(demand_change)}
 
 # === Node 3: SKU Rationalization ===
+@traced("node.sku")
 def sku_node(state: AgentState) -> AgentState:
-    summary = get_sku_summary()
-    structured_data = get_sku_structured_data()  # Use the new function
-    
-    return {
-        **state, 
-        "sku_summary": "📦 SKU Rationalization Summary:\n" + summary,
-        "sku_structured_data": structured_data
-    }
+    return {"sku_structured_data": get_sku_structured_data()}
 
 # === Node 4: Final Dashboard Aggregation ===
+def summary_text(state, key, missing):
+    summary = state.get(key, missing)
+    return "⏳ Insight still being generated." if summary is None else summary
+
+@traced("node.dashboard")
 def dashboard_node(state: AgentState) -> AgentState:
     dashboard = (
         "\n🧾 FINAL SUPPLY CHAIN DASHBOARD\n"
         "=====================================\n"
-        f"{state.get('procurement_summary', '❗ No procurement summary available.')}\n\n"
-        f"{state.get('scenario_summary', '❗ No scenario summary available.')}\n\n"
-        f"{state.get('sku_summary', '❗ No SKU summary available.')}\n"
+        f"{summary_text(state, 'procurement_summary', '❗ No procurement summary available.')}\n\n"
+        f"{summary_text(state, 'scenario_summary', '❗ No scenario summary available.')}\n\n"
+        f"{summary_text(state, 'sku_summary', '❗ No SKU summary available.')}\n"
         "=====================================\n"
     )
-    return {**state, "final_dashboard": dashboard}
\ No newline at end of file
+    return {"final_dashboard": dashboard}
+
+# === Graph: fan out the three agents, join into the dashboard ===
+ANALYSIS_NODES = {
+    "procurement": procurement_node,
+    "scenario": scenario_node,
+    "sku": sku_node,
+}
+
+def build_analysis_graph():
+    graph = StateGraph(AgentState)
+    for name, node in ANALYSIS_NODES.items():
+        graph.add_node(name, node)
+        graph.add_edge(START, name)
+    graph.add_node("dashboard", dashboard_node)
+    # A multi-source edge waits for every branch before running the join node
+    graph.add_edge(list(ANALYSIS_NODES), "dashboard")
+    graph.add_edge("dashboard", END)
+    return graph.compile()
+
+analysis_graph = build_analysis_graph()
+
+def run_analysis(state: AgentState, on_progress=None) -> AgentState:
+    """Run the structured-data phase of every agent concurrently and return the merged state.
+
+    ``on_progress(node_name, completed, total)`` is called on the caller's thread
+    as each node finishes, so it may safely update Streamlit widgets.
+    """
+    result = dict(state)
+    total = len(ANALYSIS_NODES) + 1
+    completed = 0
+    for update in analysis_graph.stream(state, stream_mode="updates"):
+        for node_name, values in update.items():
+            result.update(values or {})
+            completed += 1
+            if on_progress is not None:
+                on_progress(node_name, completed, total)
+    return result
+
+# === Phase 2: LLM narratives, generated in the background ===
+NARRATIVES = {
+    "procurement_summary": (
+        "📑 Procurement Summary:\n",
+        lambda state, stream: get_procurement_summary(stream=stream),
+    ),
+    "scenario_summary": (
+        "📈 Scenario Planning Summary:\n",
+        lambda state, stream: get_scenario_summary(state.get('demand_change', -15), stream=stream),
+    ),
+    "sku_summary": (
+        "📦 SKU Rationalization Summary:\n",
+        lambda state, stream: get_sku_summary(stream=stream),
+    ),
+}
+
+class NarrativeJob:
+    """Generates each section's summary on its own thread.
+
+    Text is exposed as it arrives (token by token when ``stream_insights`` is
+    set), so the caller can poll ``snapshot()`` and fill per-section placeholders.
+    """
+
+    def __init__(self, state: AgentState, keys=None):
+        self.keys = list(keys or NARRATIVES)
+        self._texts = {key: "" for key in self.keys}
+        self._done = set()
+        self._failed = set()
+        self._lock = threading.Lock()
+        self._threads = [
+            threading.Thread(target=self._run, args=(key, dict(state)), daemon=True)
+            for key in self.keys
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def _append(self, key, text):
+        with self._lock:
+            self._texts[key] += text
+
+    def _run(self, key, state):
+        header, summarize = NARRATIVES[key]
+        self._append(key, header)
+        try:
+            with span(f"narrative.{key}"):
+                summary = summarize(state, bool(state.get('stream_insights')))
+                if isinstance(summary, str):
+                    self._append(key, summary)
+                else:
+                    for piece in summary:
+                        self._append(key, piece)
+        except Exception as e:
+            self._append(key, f"Error generating summary: {e}")
+            with self._lock:
+                self._failed.add(key)
+        finally:
+            with self._lock:
+                self._done.add(key)
+
+    def snapshot(self):
+        # {key: (text so far, finished)}
+        with self._lock:
+            return {key: (self._texts[key], key in self._done) for key in self.keys}
+
+    def failed(self):
+        # Sections whose summary raised; their text holds the error message
+        with self._lock:
+            return sorted(self._failed)
+
+    def finished(self):
+        with self._lock:
+            return len(self._done) == len(self.keys)
+
+    def wait(self, timeout=None):
+        for thread in self._threads:
+            thread.join(timeout)
+        return self.finished()
+
+def start_narratives(state: AgentState) -> NarrativeJob:
+    return NarrativeJob(state)
+
+def apply_narratives(state: AgentState, job: NarrativeJob) -> AgentState:
+    """Copy finished narratives into ``state`` and rebuild the text dashboard."""
+    for key, (text, done) in job.snapshot().items():
+        if done:
+            state[key] = text
+    state.update(dashboard_node(state))
+    return state
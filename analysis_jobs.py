@@ -0,0 +1,219 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+import data_access
+from agent_flow import run_analysis, start_narratives, apply_narratives
+from contract_index import contracts_version
+
+# === Job Queue Configuration ===
+JOBS_PATH = os.environ.get('ANALYSIS_JOBS_PATH', './.analysis_jobs/jobs.sqlite')
+JOB_WORKERS = int(os.environ.get('ANALYSIS_JOB_WORKERS', 2))
+JOB_TTL_SECONDS = float(os.environ.get('ANALYSIS_JOB_TTL', 24 * 3600))
+REUSE_SECONDS = float(os.environ.get('ANALYSIS_JOB_REUSE', 600))  # finished runs new requests attach to
+POLL_SECONDS = 1.0           # how often idle workers check for jobs queued by other processes
+NARRATIVE_FLUSH_SECONDS = 0.5
+STALE_AFTER_SECONDS = 60     # a running job without a heartbeat for this long is picked up again
+HEARTBEAT_SECONDS = STALE_AFTER_SECONDS / 4
+
+# Request fields that define an analysis; summaries and results are outputs.
+# Workers always stream narratives, so how they are delivered is not part of a request.
+REQUEST_FIELDS = ('demand_change',)
+
+
+def _to_json(value):
+    return json.dumps(value, default=lambda o: o.item() if hasattr(o, 'item') else str(o))
+
+
+def request_key(state):
+    # Identical requests on the same data and contracts share one job
+    request = {field: state.get(field) for field in REQUEST_FIELDS}
+    request['data_version'] = data_access.data_version()
+    request['contracts_version'] = contracts_version()
+    return hashlib.sha256(json.dumps(request, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class JobQueue:
+    """SQLite-backed queue of analysis runs, executed by a pool of worker threads.
+
+    Submitting a request that matches a queued, running or recently completed
+    job returns that job's id instead of starting another run; runs where any
+    narrative failed finish as 'partial' and are never reused. Workers write
+    the structured state as soon as it is ready and flush narrative text while
+    it streams, so any session can attach to a job by id and poll ``get``.
+    """
+
+    def __init__(self, path=JOBS_PATH, workers=JOB_WORKERS, ttl_seconds=JOB_TTL_SECONDS):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._wake = threading.Condition()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, key TEXT, status TEXT, request TEXT, state TEXT,"
+            " narratives TEXT, progress REAL, error TEXT,"
+            " created_at REAL, started_at REAL, finished_at REAL, heartbeat REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_key ON jobs (key, status)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, created_at)")
+        self._conn.commit()
+
+        self._workers = [
+            threading.Thread(target=self._work, name=f"analysis-job-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    # --- Public API ---
+    def submit(self, state, force=False):
+        """Queue an analysis for ``state`` and return its job id (an existing one when deduplicated)."""
+        key = request_key(state)
+        now = time.time()
+        with self._lock:
+            self._prune(now)
+            if not force:
+                row = self._conn.execute(
+                    "SELECT id FROM jobs WHERE key = ?"
+                    " AND (status IN ('queued', 'running') OR (status = 'done' AND finished_at >= ?))"
+                    " ORDER BY created_at DESC LIMIT 1", (key, now - REUSE_SECONDS),
+                ).fetchone()
+                if row is not None:
+                    return row[0]
+            job_id = uuid.uuid4().hex
+            request = {field: state.get(field) for field in REQUEST_FIELDS}
+            self._conn.execute(
+                "INSERT INTO jobs (id, key, status, request, progress, created_at) VALUES (?, ?, 'queued', ?, 0, ?)",
+                (job_id, key, _to_json(request), now),
+            )
+            self._conn.commit()
+        with self._wake:
+            self._wake.notify()
+        return job_id
+
+    def get(self, job_id):
+        """Return the job as a dict, or None. ``state`` includes every narrative finished so far."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, status, request, state, narratives, progress, error, created_at, finished_at"
+                " FROM jobs WHERE id = ?", (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(
+            ('id', 'status', 'request', 'state', 'narratives', 'progress', 'error', 'created_at', 'finished_at'), row
+        ))
+        for field in ('request', 'state', 'narratives'):
+            job[field] = json.loads(job[field]) if job[field] else None
+        job['narratives'] = job['narratives'] or {}
+        if job['state'] is not None:
+            for key, (text, done) in job['narratives'].items():
+                if done:
+                    job['state'][key] = text
+        return job
+
+    def stats(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return dict(rows)
+
+    # --- Workers ---
+    def _update(self, job_id, **fields):
+        assignments = ", ".join(f"{field} = ?" for field in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+            self._conn.commit()
+
+    def _prune(self, now):
+        self._conn.execute(
+            "DELETE FROM jobs WHERE status IN ('done', 'partial', 'failed') AND finished_at < ?",
+            (now - self.ttl_seconds,)
+        )
+
+    def _claim(self):
+        # Queued jobs, or runs whose worker stopped sending heartbeats (e.g. the server restarted)
+        now = time.time()
+        stale = now - STALE_AFTER_SECONDS
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, request, heartbeat FROM jobs"
+                " WHERE status = 'queued' OR (status = 'running' AND heartbeat < ?)"
+                " ORDER BY created_at LIMIT 1", (stale,),
+            ).fetchone()
+            if row is None:
+                return None
+            claimed = self._conn.execute(
+                "UPDATE jobs SET status = 'running', started_at = ?, heartbeat = ?"
+                " WHERE id = ? AND heartbeat IS ?", (now, now, row[0], row[2]),
+            ).rowcount
+            self._conn.commit()
+        return (row[0], json.loads(row[1])) if claimed else None
+
+    def _work(self):
+        while True:
+            claimed = self._claim()
+            if claimed is None:
+                with self._wake:
+                    self._wake.wait(POLL_SECONDS)
+                continue
+            job_id, request = claimed
+            try:
+                self._run(job_id, request)
+            except Exception as e:
+                self._update(job_id, status='failed', error=str(e), finished_at=time.time())
+
+    def _heartbeat(self, job_id, stop):
+        # Keeps long nodes (e.g. streaming a large history) from looking stale to other workers
+        while not stop.wait(HEARTBEAT_SECONDS):
+            self._update(job_id, heartbeat=time.time())
+
+    def _run(self, job_id, request):
+        stop = threading.Event()
+        threading.Thread(
+            target=self._heartbeat, args=(job_id, stop), name=f"analysis-heartbeat-{job_id[:8]}", daemon=True
+        ).start()
+        try:
+            self._execute(job_id, request)
+        finally:
+            stop.set()
+
+    def _execute(self, job_id, request):
+        def report_progress(node_name, completed, total):
+            self._update(job_id, progress=completed / total)
+
+        state = run_analysis(dict(request), on_progress=report_progress)
+        self._update(job_id, state=_to_json(state))
+
+        # Narrative text is flushed while it streams so attached sessions see it grow
+        job = start_narratives(dict(state, stream_insights=True))
+        while not job.finished():
+            time.sleep(NARRATIVE_FLUSH_SECONDS)
+            self._update(job_id, narratives=_to_json(job.snapshot()))
+        state = apply_narratives(state, job)
+        failed = job.failed()
+        self._update(
+            job_id, status='partial' if failed else 'done', state=_to_json(state),
+            narratives=_to_json(job.snapshot()), progress=1.0, finished_at=time.time(),
+            error=f"Narratives failed: {', '.join(failed)}" if failed else None,
+        )
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = JobQueue()
+    return _queue
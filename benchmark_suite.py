@@ -0,0 +1,335 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+# Benchmarks must never read or fill the real LLM response cache, even when LLM_CACHE_PATH is set
+BENCH_CACHE_PATH = os.path.join(tempfile.gettempdir(), 'supply_chain_bench', 'llm_cache.sqlite')
+os.environ['LLM_CACHE_PATH'] = BENCH_CACHE_PATH
+
+import data_access
+import llm_client
+import scenario_planning
+import sku_rationalization
+from llm_cache import get_response_cache
+
+# === Benchmark Configuration ===
+DEFAULT_ROWS = [1_000, 10_000, 100_000]
+DEFAULT_CONTRACTS = [10, 50]
+DEFAULT_REPEATS = 3
+WRITE_CHUNK_ROWS = 1_000_000   # synthetic CSVs are written in chunks so 10^7 rows fit in memory
+STUB_LATENCY_S = 0.05
+STUB_TOKENS = 64
+REGRESSION_THRESHOLD = 0.10    # compare() flags stages more than 10% slower
+
+
+# === Synthetic supply chain data ===
+def generate_supply_chain_csv(path, n_rows, seed=0, source=None):
+    """Write ``n_rows`` rows with the ``supply_chain_data.csv`` schema.
+
+    Categorical columns are sampled with the shipped data's frequencies and numeric
+    columns are resampled from it with multiplicative noise, so distributions and
+    SKU classification mix stay close to the real file at any size.
+    """
+    source_df = pd.read_csv(source or data_access.DATA_PATH, dtype=data_access.DTYPES)
+    rng = np.random.default_rng(seed)
+
+    with open(path, 'w', newline='') as handle:
+        for start in range(0, n_rows, WRITE_CHUNK_ROWS):
+            size = min(WRITE_CHUNK_ROWS, n_rows - start)
+            chunk = {}
+            for column in source_df.columns:
+                values = source_df[column]
+                if column == 'SKU':
+                    chunk[column] = [f"SKU{i}" for i in range(start, start + size)]
+                elif column in data_access.CATEGORICAL_COLUMNS:
+                    frequencies = values.value_counts(normalize=True)
+                    chunk[column] = rng.choice(frequencies.index.astype(str), size=size, p=frequencies.to_numpy())
+                else:
+                    sampled = rng.choice(values.to_numpy(dtype='float64'), size=size)
+                    sampled = sampled * rng.lognormal(0, 0.1, size)
+                    if column in data_access.COUNT_COLUMNS:
+                        # Nullable ints write whole numbers and keep any blank cells of the source blank
+                        sampled = pd.Series(np.round(sampled)).astype('Int64')
+                    chunk[column] = sampled
+            pd.DataFrame(chunk, columns=source_df.columns).to_csv(handle, index=False, header=start == 0)
+    return path
+
+
+# === Synthetic contract corpus ===
+CLAUSES = [
+    "Payment is due within {days} days of invoice; late payments accrue interest at {rate}% per month.",
+    "Either party may terminate this agreement for convenience with {days} days written notice.",
+    "The Supplier's aggregate liability is capped at {amount} USD except for gross negligence or wilful misconduct.",
+    "The Supplier shall meet an on-time delivery rate of {rate}% measured monthly; service credits apply below target.",
+    "Goods are subject to inspection within {days} days of delivery and may be rejected for defects.",
+    "Each party shall comply with applicable laws, including data protection and anti-bribery regulations.",
+    "The Buyer may audit the Supplier's records relating to this agreement once per year on {days} days notice.",
+    "Confidential information must not be disclosed to third parties for {years} years after termination.",
+    "The Supplier warrants that goods are free from defects in material and workmanship for {years} years.",
+    "Price adjustments require {days} days notice and may not exceed {rate}% in any contract year.",
+]
+
+
+def generate_contract_corpus(directory, n_contracts, clauses_per_contract=120, seed=0):
+    """Write ``n_contracts`` plain-text contracts built from randomised procurement clauses."""
+    rng = np.random.default_rng(seed)
+    os.makedirs(directory, exist_ok=True)
+    for number in range(n_contracts):
+        lines = [f"MASTER SUPPLY AGREEMENT No. {number:05d}\n"]
+        for section, template in enumerate(rng.choice(CLAUSES, size=clauses_per_contract), 1):
+            clause = template.format(
+                days=int(rng.integers(10, 120)), rate=round(float(rng.uniform(0.5, 99)), 1),
+                amount=int(rng.integers(10_000, 5_000_000)), years=int(rng.integers(1, 6)),
+            )
+            lines.append(f"{section}. {clause}")
+        with open(os.path.join(directory, f"contract_{number:05d}.txt"), 'w') as handle:
+            handle.write("\n".join(lines))
+    return directory
+
+
+# === Stub Ollama server ===
+class _StubOllamaHandler(BaseHTTPRequestHandler):
+    latency_s = STUB_LATENCY_S
+    tokens = STUB_TOKENS
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        time.sleep(self.latency_s)
+        words = ["insight"] * self.tokens
+        usage = {'prompt_eval_count': len(body['prompt']) // 4, 'eval_count': len(words)}
+        if body.get('stream'):
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/x-ndjson')
+            self.end_headers()
+            for word in words:
+                self.wfile.write((json.dumps({'response': word + ' ', 'done': False}) + '\n').encode())
+            self.wfile.write((json.dumps({'response': '', 'done': True, **usage}) + '\n').encode())
+            return
+        payload = json.dumps({'response': ' '.join(words), 'done': True, **usage}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@contextlib.contextmanager
+def stub_ollama(latency_s=STUB_LATENCY_S, tokens=STUB_TOKENS):
+    """Point llm_client at a local fake Ollama with fixed latency and response length."""
+    handler = type('Handler', (_StubOllamaHandler,), {'latency_s': latency_s, 'tokens': tokens})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    previous_host = llm_client.OLLAMA_HOST
+    llm_client.OLLAMA_HOST = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        yield server
+    finally:
+        llm_client.OLLAMA_HOST = previous_host
+        server.shutdown()
+
+
+@contextlib.contextmanager
+def use_dataset(csv_path):
+    """Serve ``csv_path`` as the shared dataset (no Parquet copy) for the duration of the block."""
+    previous = data_access.DATA_PATH, data_access.PARQUET_DIR
+    data_access.DATA_PATH, data_access.PARQUET_DIR = csv_path, os.path.join(os.path.dirname(csv_path), 'no-parquet')
+    data_access.clear_cache()
+    sku_rationalization.default_analyzer.clear()
+    try:
+        yield
+    finally:
+        data_access.DATA_PATH, data_access.PARQUET_DIR = previous
+        data_access.clear_cache()
+        sku_rationalization.default_analyzer.clear()
+
+
+# === Timing ===
+def time_stage(func, repeats=DEFAULT_REPEATS, setup=None):
+    timings = []
+    for _ in range(repeats):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return {'min_s': min(timings), 'median_s': statistics.median(timings), 'runs': repeats}
+
+
+def benchmark_supply_chain(n_rows, workdir, repeats=DEFAULT_REPEATS, seed=0):
+    csv_path = os.path.join(workdir, f"supply_chain_{n_rows}.csv")
+    start = time.perf_counter()
+    generate_supply_chain_csv(csv_path, n_rows, seed)
+    results = {'generate_s': time.perf_counter() - start, 'csv_bytes': os.path.getsize(csv_path)}
+
+    with use_dataset(csv_path):
+        results['load_csv'] = time_stage(
+            lambda: data_access.load_supply_chain_data(), repeats, setup=data_access.clear_cache
+        )
+        df = data_access.load_supply_chain_data()
+        scenario_df = scenario_planning.load_supply_chain_data()
+        results['simulate_demand_change'] = time_stage(
+            lambda: scenario_planning.simulate_demand_change(scenario_df, -15), repeats
+        )
+        results['simulate_demand_sweep_101'] = time_stage(
+            lambda: scenario_planning.simulate_demand_sweep(scenario_df, range(-50, 51)), repeats
+        )
+        results['get_scenario_structured_data'] = time_stage(
+            lambda: scenario_planning.get_scenario_structured_data(-15), repeats
+        )
+        metrics = sku_rationalization.add_sku_metrics(df)
+        results['sku_add_metrics'] = time_stage(lambda: sku_rationalization.add_sku_metrics(df), repeats)
+        results['sku_classify'] = time_stage(lambda: sku_rationalization.classify_skus(metrics), repeats)
+        results['get_sku_structured_data'] = time_stage(
+            lambda: sku_rationalization.get_sku_structured_data(),
+            repeats, setup=sku_rationalization.default_analyzer.clear,
+        )
+        with stub_ollama():
+            results['scenario_summary_stub_llm'] = time_stage(
+                lambda: scenario_planning.get_scenario_summary(-15), repeats, setup=get_response_cache().clear
+            )
+            results['sku_summary_stub_llm'] = time_stage(
+                lambda: sku_rationalization.get_sku_summary(), repeats, setup=get_response_cache().clear
+            )
+    os.remove(csv_path)
+    return results
+
+
+def benchmark_contracts(n_contracts, workdir, seed=0):
+    # Imported lazily: the embedding stack is only needed for this part of the suite
+    import contract_index
+    import load_contracts
+
+    corpus_dir = generate_contract_corpus(os.path.join(workdir, f"contracts_{n_contracts}"), n_contracts, seed=seed)
+    index_dir = os.path.join(workdir, f"index_{n_contracts}")
+
+    start = time.perf_counter()
+    index, _ = contract_index.sync_contract_index(corpus_dir, index_dir)
+    results = {'cold_sync_s': time.perf_counter() - start, 'chunks': len(index)}
+    results.update({f"sync_{stage}": value for stage, value in index.timings.items()})
+
+    start = time.perf_counter()
+    contract_index.sync_contract_index(corpus_dir, index_dir)
+    results['warm_sync_s'] = time.perf_counter() - start
+
+    results['retrieve_context'] = time_stage(lambda: load_contracts.retrieve_context(index))
+    shutil.rmtree(corpus_dir)
+    shutil.rmtree(index_dir)
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(rows=DEFAULT_ROWS, contracts=DEFAULT_CONTRACTS, repeats=DEFAULT_REPEATS, workdir=None, seed=0):
+    """Run every benchmark and return a JSON-serialisable result document."""
+    if os.path.abspath(get_response_cache().path) != os.path.abspath(BENCH_CACHE_PATH):
+        # llm_cache was imported before this module, so its cache is the real one; it gets cleared below
+        raise RuntimeError(f"Benchmark would use the LLM cache at {get_response_cache().path}; run it in its own process")
+    workdir = workdir or tempfile.mkdtemp(prefix='supply_chain_bench_')
+    os.makedirs(workdir, exist_ok=True)
+    document = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': sys.version.split()[0],
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'repeats': repeats,
+            'seed': seed,
+        },
+        'supply_chain': {},
+        'contracts': {},
+    }
+    for n_rows in rows:
+        print(f"supply chain: {n_rows:,} rows", file=sys.stderr)
+        document['supply_chain'][str(n_rows)] = benchmark_supply_chain(n_rows, workdir, repeats, seed)
+    for n_contracts in contracts:
+        print(f"contracts: {n_contracts} files", file=sys.stderr)
+        document['contracts'][str(n_contracts)] = benchmark_contracts(n_contracts, workdir, seed)
+    return document
+
+
+# === Regression comparison ===
+def _stage_times(document):
+    # Flatten to {(suite, size, stage): seconds}, using the min over repeats where available
+    flat = {}
+    for suite in ('supply_chain', 'contracts'):
+        for size, stages in document.get(suite, {}).items():
+            for stage, value in stages.items():
+                if isinstance(value, dict) and 'min_s' in value:
+                    flat[(suite, size, stage)] = value['min_s']
+                elif stage.endswith('_s') and isinstance(value, (int, float)):
+                    flat[(suite, size, stage)] = value
+    return flat
+
+
+def compare(baseline, current, threshold=REGRESSION_THRESHOLD):
+    """Return one row per stage present in both documents with the current/baseline time ratio."""
+    before, after = _stage_times(baseline), _stage_times(current)
+    rows = []
+    for key in sorted(before.keys() & after.keys()):
+        ratio = after[key] / before[key] if before[key] else float('inf')
+        rows.append({
+            'suite': key[0], 'size': key[1], 'stage': key[2],
+            'baseline_s': before[key], 'current_s': after[key], 'ratio': ratio,
+            'regression': ratio > 1 + threshold,
+        })
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the supply chain pipeline on synthetic data")
+    parser.add_argument('--rows', type=int, nargs='*', default=DEFAULT_ROWS, help="dataset sizes, e.g. 1000 10000000")
+    parser.add_argument('--contracts', type=int, nargs='*', default=DEFAULT_CONTRACTS, help="contract corpus sizes")
+    parser.add_argument('--repeats', type=int, default=DEFAULT_REPEATS)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workdir', help="where synthetic data is written (default: a temp dir)")
+    parser.add_argument('--out', help="write the JSON results here instead of stdout")
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'), help="compare two result files")
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD)
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            baseline = json.load(f)
+        with open(args.compare[1]) as f:
+            current = json.load(f)
+        rows = compare(baseline, current, args.threshold)
+        for row in rows:
+            flag = "REGRESSION" if row['regression'] else ""
+            print(f"{row['suite']:<13}{row['size']:>10}  {row['stage']:<30}"
+                  f"{row['baseline_s']:>10.4f}s {row['current_s']:>10.4f}s  x{row['ratio']:.2f} {flag}")
+        sys.exit(1 if any(row['regression'] for row in rows) else 0)
+
+    document = run_suite(args.rows, args.contracts, args.repeats, args.workdir, args.seed)
+    output = json.dumps(document, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
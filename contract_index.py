@@ -0,0 +1,565 @@
+import argparse
+import bisect
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
+
+import faiss
+import numpy as np
+from llama_index.core import SimpleDirectoryReader
+from llama_index.core.node_parser import SentenceSplitter
+
+from model_registry import get_embedding_model
+
+# === Index Configuration ===
+CONTRACTS_DIR = "./contracts"
+INDEX_DIR = "./.contract_index"
+CHUNK_SIZE = 1024
+CHUNK_OVERLAP = 100
+EMBEDDING_MODEL = 'all-MiniLM-L6-v2'
+
+# === Ingestion Parallelism ===
+PARSE_WORKERS = int(os.environ.get('CONTRACT_PARSE_WORKERS', max(1, (os.cpu_count() or 1) - 1)))
+EMBED_BATCH_SIZE = 64
+EMBED_FLUSH_CHUNKS = 512  # chunks buffered across files before each encode call
+EMBED_THREADS = int(os.environ.get('CONTRACT_EMBED_THREADS', 0)) or None  # torch intra-op threads
+EMBED_PROCESSES = int(os.environ.get('CONTRACT_EMBED_PROCESSES', 0))  # >1: multi-process encode for bulk loads
+
+# === ANN Backend Configuration ===
+# flat: exact scan | ivf_flat: inverted lists | hnsw: graph search | ivf_pq: inverted lists + compressed vectors
+INDEX_TYPES = ('flat', 'ivf_flat', 'hnsw', 'ivf_pq')
+INDEX_TYPE = os.environ.get('CONTRACT_INDEX_TYPE', 'flat')
+IVF_NLIST = None  # None -> ~4 * sqrt(number of vectors)
+IVF_NPROBE = 16
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+PQ_M = 16
+PQ_NBITS = 8
+TRAIN_SAMPLE_SIZE = 50_000
+RETRAIN_GROWTH = 4  # retrain an IVF index once it holds this many times its training set
+
+_sync_lock = threading.Lock()
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def config_key():
+    # Any change to chunking or the embedding model invalidates every cached vector
+    params = {'chunk_size': CHUNK_SIZE, 'chunk_overlap': CHUNK_OVERLAP, 'model': EMBEDDING_MODEL}
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def list_contract_files(contracts_dir=CONTRACTS_DIR):
+    paths = []
+    for root, _, files in os.walk(contracts_dir):
+        for name in files:
+            if not name.startswith('.'):
+                paths.append(os.path.join(root, name))
+    return sorted(paths)
+
+
+def contracts_version(contracts_dir=CONTRACTS_DIR):
+    # Names, sizes and mtimes only: changes whenever a sync would, without hashing any file
+    digest = hashlib.sha256()
+    for path in list_contract_files(contracts_dir):
+        stat = os.stat(path)
+        digest.update(f"{os.path.relpath(path, contracts_dir)}:{stat.st_size}:{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()[:16]
+
+
+def _write_json(path, payload):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def chunk_contract(path):
+    documents = SimpleDirectoryReader(input_files=[path]).load_data()
+    splitter = SentenceSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    return [node.text for node in splitter.get_nodes_from_documents(documents)]
+
+
+# === Per-file embedding cache, keyed by content hash ===
+def _cache_paths(cache_dir, digest):
+    return os.path.join(cache_dir, digest + '.json'), os.path.join(cache_dir, digest + '.npy')
+
+
+def _load_cached(cache_dir, digest):
+    texts_file, vectors_file = _cache_paths(cache_dir, digest)
+    return _read_json(texts_file), np.load(vectors_file)
+
+
+def _is_cached(cache_dir, digest):
+    return all(os.path.exists(path) for path in _cache_paths(cache_dir, digest))
+
+
+def _embedding_model():
+    if EMBED_THREADS:
+        import torch
+        torch.set_num_threads(EMBED_THREADS)
+    return get_embedding_model(EMBEDDING_MODEL)
+
+
+def _iter_parsed(pending):
+    # Yields (digest, chunk texts) in completion order so embedding starts before parsing ends
+    if PARSE_WORKERS <= 1 or len(pending) < 2:
+        for digest, path in pending.items():
+            yield digest, chunk_contract(path)
+        return
+    with ProcessPoolExecutor(max_workers=min(PARSE_WORKERS, len(pending))) as executor:
+        futures = {executor.submit(chunk_contract, path): digest for digest, path in pending.items()}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+
+def embed_contracts(records, cache_dir, timings=None):
+    """Parse, chunk and embed every record whose content hash is not cached yet.
+
+    PDF parsing runs in a process pool; chunks are buffered across files and
+    encoded in batches of at least ``EMBED_FLUSH_CHUNKS`` texts. Stage times are
+    accumulated into ``timings``.
+    """
+    timings = {} if timings is None else timings
+    for key in ('parse_s', 'model_load_s', 'embed_s'):
+        timings.setdefault(key, 0.0)
+    timings.setdefault('chunks_embedded', 0)
+    pending = {}
+    for record in records:
+        if not _is_cached(cache_dir, record['sha256']):
+            pending.setdefault(record['sha256'], record['path'])
+    if not pending:
+        return timings
+
+    model, pool, buffer = None, None, []
+
+    def flush():
+        nonlocal model, pool
+        texts = [text for _, file_texts in buffer for text in file_texts]
+        embeddings = np.zeros((0, 0), dtype='float32')
+        if texts:
+            if model is None:
+                start = time.perf_counter()
+                model = _embedding_model()
+                if EMBED_PROCESSES > 1 and len(pending) > 1:
+                    pool = model.start_multi_process_pool(['cpu'] * EMBED_PROCESSES)
+                timings['model_load_s'] += time.perf_counter() - start
+            start = time.perf_counter()
+            if pool is not None:
+                embeddings = model.encode_multi_process(texts, pool, batch_size=EMBED_BATCH_SIZE)
+            else:
+                embeddings = model.encode(texts, batch_size=EMBED_BATCH_SIZE)
+            embeddings = np.asarray(embeddings, dtype='float32')
+            timings['embed_s'] += time.perf_counter() - start
+            timings['chunks_embedded'] += len(texts)
+        offset = 0
+        for digest, file_texts in buffer:
+            texts_file, vectors_file = _cache_paths(cache_dir, digest)
+            vectors = embeddings[offset:offset + len(file_texts)] if file_texts else np.zeros((0, 0), dtype='float32')
+            offset += len(file_texts)
+            np.save(vectors_file, vectors)
+            _write_json(texts_file, file_texts)
+        buffer.clear()
+
+    try:
+        parsed = _iter_parsed(pending)
+        while True:
+            start = time.perf_counter()
+            item = next(parsed, None)
+            timings['parse_s'] += time.perf_counter() - start
+            if item is None:
+                break
+            buffer.append(item)
+            if sum(len(texts) for _, texts in buffer) >= EMBED_FLUSH_CHUNKS:
+                flush()
+        flush()
+    finally:
+        if pool is not None:
+            model.stop_multi_process_pool(pool)
+    return timings
+
+
+def encode_queries(queries):
+    return np.asarray(get_embedding_model(EMBEDDING_MODEL).encode(list(queries)), dtype='float32')
+
+
+@lru_cache(maxsize=256)
+def _cached_texts(texts_file):
+    return tuple(_read_json(texts_file))
+
+
+# === Loaded index + chunk lookup ===
+class ContractIndex:
+    """FAISS index over contract chunks whose ids map back to (file, chunk) via the manifest."""
+
+    def __init__(self, index, manifest, cache_dir, timings=None):
+        self.index = index
+        self.manifest = manifest
+        self.cache_dir = cache_dir
+        self.timings = timings or {}  # per-stage seconds of the sync that produced this index
+        if index is not None:
+            set_search_params(index)
+        # Each file owns a contiguous id range starting at first_id
+        entries = sorted(
+            (entry['first_id'], name, entry)
+            for name, entry in manifest['files'].items() if entry['count']
+        )
+        self._starts = [start for start, _, _ in entries]
+        self._entries = [(name, entry) for _, name, entry in entries]
+
+    def __len__(self):
+        return 0 if self.index is None else self.index.ntotal
+
+    @property
+    def contracts_processed(self):
+        return len(self.manifest['files'])
+
+    def get_chunk(self, chunk_id):
+        pos = bisect.bisect_right(self._starts, chunk_id) - 1
+        if pos < 0:
+            raise KeyError(chunk_id)
+        name, entry = self._entries[pos]
+        offset = chunk_id - entry['first_id']
+        if offset >= entry['count']:
+            raise KeyError(chunk_id)
+        texts_file, _ = _cache_paths(self.cache_dir, entry['sha256'])
+        return {'text': _cached_texts(texts_file)[offset], 'source': os.path.basename(name)}
+
+    def search(self, query_vectors, top_k):
+        """Return one ``[(chunk_id, distance), ...]`` list per query vector, nearest first."""
+        if not len(self):
+            return [[] for _ in range(len(query_vectors))]
+        distances, ids = self.index.search(np.asarray(query_vectors, dtype='float32'), min(top_k, len(self)))
+        return [
+            [(int(i), float(d)) for i, d in zip(row_ids, row_distances) if i != -1]
+            for row_ids, row_distances in zip(ids, distances)
+        ]
+
+    def iter_chunks(self):
+        for name, entry in self._entries:
+            texts_file, _ = _cache_paths(self.cache_dir, entry['sha256'])
+            for offset, text in enumerate(_cached_texts(texts_file)):
+                yield entry['first_id'] + offset, {'text': text, 'source': os.path.basename(name)}
+
+
+# === ANN Backends ===
+def _training_sample(vectors):
+    if len(vectors) <= TRAIN_SAMPLE_SIZE:
+        return vectors
+    rows = np.random.default_rng(0).choice(len(vectors), TRAIN_SAMPLE_SIZE, replace=False)
+    return vectors[np.sort(rows)]
+
+
+def make_index(index_type, training_vectors):
+    """Create an empty id-addressable index of ``index_type``, trained on ``training_vectors`` if needed.
+
+    Returns ``(index, effective_type)``; IVF types fall back to a simpler backend
+    when there are too few vectors to train their quantizers.
+    """
+    n_vectors, dimension = training_vectors.shape
+    effective_type = index_type
+    # faiss wants ~39 training points per k-means centroid
+    if effective_type == 'ivf_pq' and n_vectors < 39 * 2 ** PQ_NBITS:
+        effective_type = 'ivf_flat'
+    if effective_type == 'ivf_flat' and n_vectors < 39:
+        effective_type = 'flat'
+
+    if effective_type in ('ivf_flat', 'ivf_pq'):
+        nlist = IVF_NLIST or int(4 * np.sqrt(n_vectors))
+        nlist = max(1, min(nlist, n_vectors // 39))
+        quantizer = faiss.IndexFlatL2(dimension)
+        if effective_type == 'ivf_flat':
+            index = faiss.IndexIVFFlat(quantizer, dimension, nlist)
+        else:
+            # Sub-quantizer count has to divide the embedding dimension
+            pq_m = max(m for m in range(1, PQ_M + 1) if dimension % m == 0)
+            index = faiss.IndexIVFPQ(quantizer, dimension, nlist, pq_m, PQ_NBITS)
+        index.train(_training_sample(training_vectors))
+        return index, effective_type  # IVF indexes handle add_with_ids/remove_ids natively
+    if effective_type == 'hnsw':
+        base = faiss.IndexHNSWFlat(dimension, HNSW_M)
+        base.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        return faiss.IndexIDMap2(base), effective_type
+    return faiss.IndexIDMap2(faiss.IndexFlatL2(dimension)), effective_type
+
+
+def set_search_params(index, nprobe=None, ef_search=None):
+    params = faiss.ParameterSpace()
+    for name, value in (('nprobe', nprobe or IVF_NPROBE), ('efSearch', ef_search or HNSW_EF_SEARCH)):
+        try:
+            params.set_index_parameter(index, name, value)
+        except RuntimeError:
+            pass  # parameter does not apply to this backend
+
+
+def _rebuild_index(manifest, cache_dir, index_type):
+    ids, vectors = [], []
+    for entry in manifest['files'].values():
+        if entry['count']:
+            _, vectors_file = _cache_paths(cache_dir, entry['sha256'])
+            vectors.append(np.load(vectors_file))
+            ids.append(np.arange(entry['first_id'], entry['first_id'] + entry['count'], dtype='int64'))
+    manifest['index_type'] = index_type
+    if not vectors:
+        manifest.update(effective_type=None, trained_on=0)
+        return None
+    vectors = np.vstack(vectors)
+    index, effective_type = make_index(index_type, vectors)
+    index.add_with_ids(vectors, np.concatenate(ids))
+    manifest.update(effective_type=effective_type, trained_on=len(vectors))
+    return index
+
+
+def _empty_manifest():
+    return {'next_id': 0, 'ntotal': 0, 'files': {}}
+
+
+def _load_store(store_dir):
+    manifest_file = os.path.join(store_dir, 'manifest.json')
+    index_file = os.path.join(store_dir, 'index.faiss')
+    if not (os.path.exists(manifest_file) and os.path.exists(index_file)):
+        return _empty_manifest(), None
+    manifest = _read_json(manifest_file)
+    index = faiss.read_index(index_file)
+    if manifest.get('ntotal') != index.ntotal:
+        # Interrupted write: index and manifest disagree, rebuild from the embedding cache
+        return _empty_manifest(), None
+    return manifest, index
+
+
+def _save_store(store_dir, manifest, index):
+    index_file = os.path.join(store_dir, 'index.faiss')
+    manifest['ntotal'] = 0 if index is None else index.ntotal
+    if index is not None:
+        faiss.write_index(index, index_file + '.tmp')
+        os.replace(index_file + '.tmp', index_file)
+    _write_json(os.path.join(store_dir, 'manifest.json'), manifest)
+
+
+def scan_changes(contracts_dir, manifest):
+    """Compare the folder against the manifest using mtime/size first and content hash second."""
+    added, updated, touched = {}, {}, {}
+    seen = set()
+    for path in list_contract_files(contracts_dir):
+        name = os.path.relpath(path, contracts_dir)
+        seen.add(name)
+        stat = os.stat(path)
+        previous = manifest['files'].get(name)
+        if previous and previous['mtime'] == stat.st_mtime and previous['size'] == stat.st_size:
+            continue
+        record = {'path': path, 'mtime': stat.st_mtime, 'size': stat.st_size, 'sha256': file_sha256(path)}
+        if previous is None:
+            added[name] = record
+        elif previous['sha256'] == record['sha256']:
+            touched[name] = record
+        else:
+            updated[name] = record
+    deleted = sorted(set(manifest['files']) - seen)
+    return added, updated, deleted, touched
+
+
+def sync_contract_index(contracts_dir=CONTRACTS_DIR, index_dir=INDEX_DIR, index_type=None):
+    """Bring the on-disk index in line with ``contracts_dir`` and return ``(ContractIndex, changes)``.
+
+    Only added or modified contracts are embedded; their old vectors and those of
+    deleted contracts are removed by id, so the rest of the index is left untouched.
+    The index is rebuilt from cached embeddings (never re-embedded) when the backend
+    changes, when HNSW would need a removal, or when an IVF index outgrows its training set.
+    """
+    index_type = index_type or INDEX_TYPE
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type {index_type!r}; expected one of {INDEX_TYPES}")
+    store_dir = os.path.join(index_dir, config_key())
+    cache_dir = os.path.join(store_dir, 'embeddings')
+    os.makedirs(cache_dir, exist_ok=True)
+
+    with _sync_lock:
+        sync_start = time.perf_counter()
+        manifest, index = _load_store(store_dir)
+        added, updated, deleted, touched = scan_changes(contracts_dir, manifest)
+        changes = {'added': sorted(added), 'updated': sorted(updated), 'deleted': deleted}
+        rebuild = index is not None and manifest.get('index_type') != index_type
+        timings = {'scan_s': time.perf_counter() - sync_start}
+
+        if not (added or updated or deleted or touched or rebuild):
+            timings['total_s'] = timings['scan_s']
+            return ContractIndex(index, manifest, cache_dir, timings), changes
+
+        # Step 1: drop vectors of deleted and modified contracts
+        stale = [manifest['files'][name] for name in deleted + sorted(updated)]
+        stale_ids = [np.arange(e['first_id'], e['first_id'] + e['count'], dtype='int64') for e in stale if e['count']]
+        if stale_ids and index is not None and not rebuild:
+            if manifest.get('effective_type') == 'hnsw':
+                rebuild = True  # HNSW graphs cannot drop nodes
+            else:
+                index.remove_ids(np.concatenate(stale_ids))
+        for name in deleted:
+            del manifest['files'][name]
+
+        # Step 2: embed only the delta and append it under fresh ids
+        delta = sorted({**added, **updated}.items())
+        embed_contracts([record for _, record in delta], cache_dir, timings)
+
+        start = time.perf_counter()
+        for name, record in delta:
+            texts, embeddings = _load_cached(cache_dir, record['sha256'])
+            first_id = manifest['next_id']
+            if texts:
+                if index is None or rebuild:
+                    rebuild = True  # a new index is trained on the whole corpus below
+                else:
+                    index.add_with_ids(embeddings, np.arange(first_id, first_id + len(texts), dtype='int64'))
+                manifest['next_id'] = first_id + len(texts)
+            manifest['files'][name] = {
+                'mtime': record['mtime'], 'size': record['size'], 'sha256': record['sha256'],
+                'first_id': first_id, 'count': len(texts),
+            }
+
+        for name, record in touched.items():
+            manifest['files'][name].update(mtime=record['mtime'], size=record['size'])
+
+        if index_type in ('ivf_flat', 'ivf_pq') and index is not None:
+            rebuild = rebuild or index.ntotal >= RETRAIN_GROWTH * max(manifest.get('trained_on', 0), 1)
+        if rebuild:
+            index = _rebuild_index(manifest, cache_dir, index_type)
+        timings['index_s'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        _save_store(store_dir, manifest, index)
+        _prune_cache(cache_dir, manifest)
+        timings['save_s'] = time.perf_counter() - start
+        timings['total_s'] = time.perf_counter() - sync_start
+        return ContractIndex(index, manifest, cache_dir, timings), changes
+
+
+def _prune_cache(cache_dir, manifest):
+    live = {entry['sha256'] for entry in manifest['files'].values()}
+    for name in os.listdir(cache_dir):
+        digest, ext = os.path.splitext(name)
+        if ext in ('.json', '.npy') and digest not in live:
+            os.remove(os.path.join(cache_dir, name))
+
+
+def load_contract_index(contracts_dir=CONTRACTS_DIR, index_dir=INDEX_DIR, index_type=None):
+    contract_index, _ = sync_contract_index(contracts_dir, index_dir, index_type)
+    if not len(contract_index):
+        raise ValueError(f"No contract text found under {contracts_dir}")
+    return contract_index
+
+
+# === Recall vs latency benchmark ===
+def synthetic_embeddings(n_vectors, dimension=384, n_clusters=200, seed=0):
+    # Clustered vectors behave more like sentence embeddings than uniform noise does
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(n_clusters, dimension)).astype('float32')
+    vectors = centers[rng.integers(0, n_clusters, n_vectors)]
+    return vectors + 0.5 * rng.normal(size=(n_vectors, dimension)).astype('float32')
+
+
+def benchmark_index_backends(vectors, queries, top_k=10, index_types=INDEX_TYPES, nprobe=None, ef_search=None):
+    """Measure build time, query latency, memory and recall@k of each backend against exact search."""
+    vectors = np.ascontiguousarray(vectors, dtype='float32')
+    queries = np.ascontiguousarray(queries, dtype='float32')
+    ids = np.arange(len(vectors), dtype='int64')
+
+    results, ground_truth = [], None
+    for index_type in ['flat'] + [t for t in index_types if t != 'flat']:
+        start = time.perf_counter()
+        index, effective_type = make_index(index_type, vectors)
+        index.add_with_ids(vectors, ids)
+        build_seconds = time.perf_counter() - start
+        set_search_params(index, nprobe, ef_search)
+
+        start = time.perf_counter()
+        _, found = index.search(queries, top_k)
+        query_seconds = time.perf_counter() - start
+
+        if ground_truth is None:
+            ground_truth = found
+        recall = np.mean([len(set(row) & set(truth)) / top_k for row, truth in zip(found, ground_truth)])
+        results.append({
+            'index_type': index_type,
+            'effective_type': effective_type,
+            'build_s': round(build_seconds, 4),
+            'query_ms_per_query': round(1000 * query_seconds / len(queries), 4),
+            f'recall@{top_k}': round(float(recall), 4),
+            'index_mb': round(faiss.serialize_index(index).nbytes / 1e6, 2),
+        })
+    return results
+
+
+def load_cached_embeddings(index_dir=INDEX_DIR):
+    cache_dir = os.path.join(index_dir, config_key(), 'embeddings')
+    vectors = [np.load(os.path.join(cache_dir, name)) for name in sorted(os.listdir(cache_dir)) if name.endswith('.npy')]
+    vectors = [v for v in vectors if v.size]
+    return np.vstack(vectors) if vectors else np.zeros((0, 0), dtype='float32')
+
+
+# === Watcher ===
+def watch_contracts(contracts_dir=CONTRACTS_DIR, index_dir=INDEX_DIR, interval=5.0,
+                    on_change=None, stop_event=None, index_type=None):
+    """Poll ``contracts_dir`` and apply incremental updates until ``stop_event`` is set."""
+    stop_event = stop_event or threading.Event()
+    while not stop_event.is_set():
+        contract_index, changes = sync_contract_index(contracts_dir, index_dir, index_type)
+        if any(changes.values()) and on_change is not None:
+            on_change(contract_index, changes)
+        stop_event.wait(interval)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the contract embedding index")
+    parser.add_argument('--contracts', default=CONTRACTS_DIR)
+    parser.add_argument('--index-dir', default=INDEX_DIR)
+    parser.add_argument('--watch', action='store_true', help="keep polling for added/changed/deleted contracts")
+    parser.add_argument('--interval', type=float, default=5.0)
+    parser.add_argument('--index-type', choices=INDEX_TYPES, default=None)
+    parser.add_argument('--benchmark', action='store_true', help="compare ANN backends against exact search")
+    parser.add_argument('--synthetic', type=int, default=0, help="benchmark on N synthetic vectors instead of the corpus")
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--top-k', type=int, default=10)
+    args = parser.parse_args()
+
+    if args.benchmark:
+        vectors = synthetic_embeddings(args.synthetic) if args.synthetic else load_cached_embeddings(args.index_dir)
+        if not len(vectors):
+            parser.error("no cached embeddings; sync the index first or pass --synthetic N")
+        rng = np.random.default_rng(1)
+        picks = rng.integers(0, len(vectors), args.queries)
+        queries = vectors[picks] + 0.1 * rng.normal(size=(args.queries, vectors.shape[1])).astype('float32')
+        for row in benchmark_index_backends(vectors, queries, args.top_k):
+            print(json.dumps(row))
+        raise SystemExit(0)
+
+    def report(contract_index, changes):
+        print(f"[{time.strftime('%H:%M:%S')}] {len(contract_index)} chunks from "
+              f"{contract_index.contracts_processed} contracts | "
+              + ", ".join(f"{kind}: {len(names)}" for kind, names in changes.items()))
+        print("  timings: " + ", ".join(
+            f"{stage}={value:.3f}" if isinstance(value, float) else f"{stage}={value}"
+            for stage, value in contract_index.timings.items()))
+
+    if args.watch:
+        try:
+            watch_contracts(args.contracts, args.index_dir, args.interval, on_change=report,
+                            index_type=args.index_type)
+        except KeyboardInterrupt:
+            pass
+    else:
+        report(*sync_contract_index(args.contracts, args.index_dir, args.index_type))
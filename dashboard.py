@@ -1,9 +1,20 @@
 import streamlit as st
 import pandas as pd
+import time
 from datetime import datetime
 import plotly.express as px
 import plotly.graph_objects as go
-from agent_flow import procurement_node, scenario_node, sku_node, dashboard_node, AgentState
+from agent_flow import AgentState
+from analysis_jobs import get_job_queue
+from llm_client import get_metrics
+import instrumentation
+from model_registry import warm_up
+from llm_cache import get_response_cache
+from risk_simulation import run_monte_carlo
+from scenario_cube import get_scenario_cube, DEMAND_CHANGES, CUBE_DIMENSIONS
+from drilldown import get_drilldown_index, DRILLDOWN_DIMENSIONS, RECOMMENDATION
+from sku_rationalization import get_sku_item_insights, SKU_ITEM_LIMIT
+from load_contracts import get_contract_item_insights
 
 # Configure Streamlit page
 st.set_page_config(
@@ -49,6 +60,29 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# Load the embedding model once per server process, without blocking the first render
+@st.cache_resource(show_spinner=False)
+def warm_up_models():
+    return warm_up(background=True)
+
+warm_up_models()
+
+# Expose span totals for Prometheus when a port is configured
+if instrumentation.METRICS_PORT:
+    st.cache_resource(instrumentation.start_metrics_server)()
+
+# Narrative placeholders filled in by the polling loop at the end of the script
+pending_summaries = {}
+
+def render_summary(data, key):
+    # Finished narratives are plain text; pending ones get a placeholder that fills as text arrives
+    summary = data.get(key)
+    if summary is not None:
+        st.write(summary)
+    else:
+        pending_summaries[key] = st.empty()
+        pending_summaries[key].info("⏳ Generating AI insights...")
+
 # Initialize session state
 if 'analysis_complete' not in st.session_state:
     st.session_state.analysis_complete = False
@@ -69,19 +103,25 @@ with st.sidebar:
     st.subheader("📈 Scenario Parameters")
     scenario_change = st.slider(
         "Demand Change (%)",
-        min_value=-50,
-        max_value=50,
+        min_value=int(DEMAND_CHANGES[0]),
+        max_value=int(DEMAND_CHANGES[-1]),
         value=st.session_state.scenario_change,
-        step=5,
+        step=int(DEMAND_CHANGES[1] - DEMAND_CHANGES[0]),
         help="Adjust demand change percentage for scenario analysis"
     )
     
     # Update session state when slider changes
     st.session_state.scenario_change = scenario_change
+
+    force_rerun = st.checkbox(
+        "Force fresh run",
+        value=False,
+        help="Start a new analysis even if an identical one finished recently"
+    )
     
     # Analysis trigger
     if st.button("🔄 Run Complete Analysis", type="primary", use_container_width=True):
-        with st.spinner("Analyzing supply chain data..."):
+        with st.spinner("Submitting analysis..."):
             try:
                 # Initialize state with the session state value
                 state = AgentState(
@@ -91,49 +131,60 @@ with st.sidebar:
                     demand_change=st.session_state.scenario_change,
                     sku_structured_data=None,
                     scenario_structured_data=None,
-                    procurement_structured_data=None
+                    procurement_structured_data=None,
+                    final_dashboard=None
                 )
                 
-                # Run analysis nodes with progress tracking
-                progress_bar = st.progress(0)
-                
-                # Procurement Analysis
-                st.text("📄 Running procurement analysis...")
-                state = procurement_node(state)
-                progress_bar.progress(25)
-                
-                # Scenario Planning
-                st.text("📈 Running scenario planning...")
-                state = scenario_node(state)
-                progress_bar.progress(50)
-                
-                # SKU Rationalization
-                st.text("📦 Running SKU rationalization...")
-                state = sku_node(state)
-                progress_bar.progress(75)
-                
-                # Final Dashboard
-                st.text("📊 Generating final dashboard...")
-                state = dashboard_node(state)
-                progress_bar.progress(100)
-                
-                st.session_state.analysis_data = state
-                st.session_state.analysis_complete = True
-                st.success("Analysis completed successfully! ✅")
+                # Runs on the shared job queue; identical requests from any session attach to the same run
+                st.query_params['job'] = get_job_queue().submit(state, force=force_rerun)
                 
             except Exception as e:
                 st.error(f"❌ Error during analysis: {str(e)}")
     
+    # LLM response cache counters
+    st.markdown("---")
+    with st.expander("🧠 LLM Response Cache"):
+        cache_stats = get_response_cache().stats()
+        cache_col1, cache_col2 = st.columns(2)
+        cache_col1.metric("Hits", cache_stats['hits'])
+        cache_col2.metric("Misses", cache_stats['misses'])
+        st.caption(
+            f"Hit rate {cache_stats['hit_rate']:.0%} · {cache_stats['entries']} cached responses "
+            f"({cache_stats['bytes'] / 1024:.1f} KB)"
+        )
+        if st.button("Clear LLM cache", use_container_width=True):
+            get_response_cache().clear()
+            st.rerun()
+
     # Refresh timestamp
     st.markdown("---")
     st.caption(f"🕒 Last Updated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
 
+# Attach to the analysis job named in the URL, so refreshes and other analysts share the same run
+job_id = st.query_params.get('job')
+analysis_job = get_job_queue().get(job_id) if job_id else None
+if analysis_job is not None:
+    if analysis_job['state'] is not None:
+        st.session_state.analysis_data = analysis_job['state']
+        st.session_state.analysis_complete = True
+        if analysis_job['status'] == 'partial':
+            st.warning(f"⚠️ {analysis_job['error']}. Run the analysis again to retry them.")
+    elif analysis_job['status'] == 'failed':
+        st.error(f"❌ Error during analysis: {analysis_job['error']}")
+    else:
+        st.progress(
+            int(100 * (analysis_job['progress'] or 0)),
+            text=f"🚀 Running procurement, scenario and SKU agents ({analysis_job['status']})..."
+        )
+        time.sleep(0.3)
+        st.rerun()
+
 # Main dashboard content
 if st.session_state.analysis_complete and st.session_state.analysis_data:
     data = st.session_state.analysis_data
     
     # Create tabs for different sections
-    tab1, tab2, tab3, tab4 = st.tabs(["📋 Executive Summary", "📦 SKU Analysis", "📈 Scenario Planning", "📄 Procurement"])
+    tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs(["📋 Executive Summary", "📦 SKU Analysis", "📈 Scenario Planning", "📄 Procurement", "🔎 Drill-down", "⚡ Performance"])
     
     with tab1:
         st.markdown('<h2 class="section-header">Executive Summary</h2>', unsafe_allow_html=True)
@@ -195,7 +246,7 @@ if st.session_state.analysis_complete and st.session_state.analysis_data:
     with tab2:
         st.markdown('<h2 class="section-header">SKU Rationalization Analysis</h2>', unsafe_allow_html=True)
         
-        if data.get('sku_structured_data') and data.get('sku_summary'):
+        if data.get('sku_structured_data'):
             sku_data = data['sku_structured_data']
             
             # Display real SKU distribution
@@ -246,7 +297,31 @@ if st.session_state.analysis_complete and st.session_state.analysis_data:
             
             # Display AI summary
             st.markdown("### Recommendations for warehouse management")             
-            st.write(data['sku_summary'])          
+            render_summary(data, 'sku_summary')          
+
+            # Per-SKU insights for the worst discontinue candidates, shown as each one arrives
+            with st.expander("🔍 Per-SKU Insights"):
+                sku_limit = st.number_input(
+                    "Discontinue candidates", min_value=1, max_value=1000, value=SKU_ITEM_LIMIT, step=5
+                )
+                if st.button("Generate per-SKU insights", use_container_width=True):
+                    sku_status = st.empty()
+                    finished_skus = []
+
+                    def show_sku_insight(sku, text, error):
+                        finished_skus.append(sku)
+                        st.markdown(f"**{sku}**: {text if error is None else f'Error getting LLM insight: {error}'}")
+                        sku_status.caption(f"{len(finished_skus)} SKUs analyzed...")
+
+                    st.session_state.sku_item_insights = get_sku_item_insights(
+                        limit=int(sku_limit), on_result=show_sku_insight
+                    )
+                    sku_status.empty()
+                elif st.session_state.get('sku_item_insights') is not None:
+                    st.dataframe(
+                        st.session_state.sku_item_insights[['SKU', 'Product type', 'Profit Margin', 'Insight']],
+                        use_container_width=True, hide_index=True
+                    )
             
         else:
             st.warning("SKU analysis data not available. Please run the analysis.")
@@ -254,8 +329,10 @@ if st.session_state.analysis_complete and st.session_state.analysis_data:
     with tab3:
         st.markdown('<h2 class="section-header">Scenario Planning Results</h2>', unsafe_allow_html=True)
         
-        if data.get('scenario_structured_data') and data.get('scenario_summary'):
-            scenario_data = data['scenario_structured_data']
+        if data.get('scenario_structured_data'):
+            # Numbers follow the slider from the precomputed cube; only the AI narrative needs a rerun
+            scenario_cube = get_scenario_cube()
+            scenario_data = scenario_cube.structured_data(st.session_state.scenario_change)
             
             # Display real scenario analysis
             col1, col2 = st.columns(2)
@@ -301,9 +378,91 @@ if st.session_state.analysis_complete and st.session_state.analysis_data:
                 st.metric("Avg Lead Time", f"{scenario_data['lead_time']:.2f} days")
                 st.metric("Shipping Cost", f"${scenario_data['shipping_cost']:.2f}")
             
+            # Full sensitivity curve, precomputed in the cube for every slider value
+            st.subheader("📉 Revenue Sensitivity")
+            sweep = scenario_cube.sweep()
+            fig_sweep = px.line(
+                sweep,
+                x='demand_change',
+                y='simulated_revenue',
+                labels={'demand_change': 'Demand Change (%)', 'simulated_revenue': 'Simulated Revenue ($)'},
+                title='Simulated Revenue across Demand Changes'
+            )
+            fig_sweep.add_hline(y=scenario_data['base_revenue'], line_dash='dot', annotation_text='Base Case')
+            fig_sweep.add_scatter(
+                x=[scenario_data['demand_change']],
+                y=[scenario_data['simulated_revenue']],
+                mode='markers',
+                marker=dict(size=12, color='green' if scenario_data['demand_change'] >= 0 else 'red'),
+                name='Selected scenario'
+            )
+            st.plotly_chart(fig_sweep, use_container_width=True)
+
+            # Per-group impact at the selected demand change
+            st.subheader("🧩 Impact by Dimension")
+            dimension = st.selectbox("Break down by", list(CUBE_DIMENSIONS))
+            breakdown = scenario_cube.breakdown(scenario_data['demand_change'], dimension)
+            fig_breakdown = px.bar(
+                breakdown,
+                x=dimension,
+                y=['base_revenue', 'simulated_revenue'],
+                barmode='group',
+                labels={'value': 'Revenue ($)', 'variable': ''},
+                title=f"Revenue by {dimension}: {scenario_data['demand_change']}% Demand Change"
+            )
+            st.plotly_chart(fig_breakdown, use_container_width=True)
+            st.dataframe(breakdown, use_container_width=True, hide_index=True)
+
+            # Probabilistic view: demand, lead-time and shipping-cost uncertainty around the scenario
+            with st.expander("🎲 Monte Carlo Risk Simulation"):
+                mc_col1, mc_col2 = st.columns(2)
+                n_trials = mc_col1.number_input(
+                    "Trials", min_value=10_000, max_value=10_000_000, value=100_000, step=50_000
+                )
+                mc_seed = mc_col2.number_input("Seed", min_value=0, value=42, step=1)
+                if st.button("Run simulation", use_container_width=True):
+                    with st.spinner(f"Simulating {n_trials:,} trials..."):
+                        st.session_state.risk_result = run_monte_carlo(
+                            int(n_trials), scenario_data['demand_change'], seed=int(mc_seed)
+                        )
+
+                risk = st.session_state.get('risk_result')
+                if risk and risk['demand_change'] == scenario_data['demand_change']:
+                    risk_cols = st.columns(5)
+                    risk_cols[0].metric("P5 Revenue", f"${risk['percentiles'][5]:,.0f}")
+                    risk_cols[1].metric("P50 Revenue", f"${risk['percentiles'][50]:,.0f}")
+                    risk_cols[2].metric("P95 Revenue", f"${risk['percentiles'][95]:,.0f}")
+                    risk_cols[3].metric("VaR (95%)", f"${risk['var_95']:,.0f}")
+                    risk_cols[4].metric("CVaR (95%)", f"${risk['cvar_95']:,.0f}")
+
+                    histogram = pd.DataFrame(risk['histogram'])
+                    fig_risk = go.Figure(data=[
+                        go.Bar(
+                            x=(histogram['bin_start'] + histogram['bin_end']) / 2,
+                            y=histogram['count'],
+                            width=histogram['bin_end'] - histogram['bin_start'],
+                            marker_color='steelblue'
+                        )
+                    ])
+                    fig_risk.add_vline(x=risk['base_revenue'], line_dash='dot', annotation_text='Base Case (net of shipping)')
+                    fig_risk.add_vline(x=risk['percentiles'][5], line_dash='dash', line_color='red', annotation_text='P5')
+                    fig_risk.update_layout(
+                        title=f"Revenue Distribution ({risk['trials']:,} trials, seed {risk['seed']})",
+                        xaxis_title='Net Revenue ($)',
+                        yaxis_title='Trials',
+                        showlegend=False
+                    )
+                    st.plotly_chart(fig_risk, use_container_width=True)
+                    st.caption(f"Probability of falling below base revenue: {risk['prob_below_base']:.1%}")
+            
             # Display AI summary
             st.markdown("### 🤖 Scenario Insights")             
-            st.write(data['scenario_summary'])             
+            if data['demand_change'] != scenario_data['demand_change']:
+                st.caption(
+                    f"Insights were generated for a {data['demand_change']}% demand change; "
+                    "run the analysis again to refresh them."
+                )
+            render_summary(data, 'scenario_summary')             
             
         else:
             st.warning("Scenario analysis data not available. Please run the analysis.")
@@ -311,7 +470,7 @@ if st.session_state.analysis_complete and st.session_state.analysis_data:
     with tab4:
         st.markdown('<h2 class="section-header">Procurement Contract Analysis</h2>', unsafe_allow_html=True)
         
-        if data.get('procurement_structured_data') and data.get('procurement_summary'):
+        if data.get('procurement_structured_data'):
             procurement_data = data['procurement_structured_data']
             
             # Display real procurement analysis
@@ -357,11 +516,114 @@ if st.session_state.analysis_complete and st.session_state.analysis_data:
             
             # Display AI summary
             st.markdown("### 📊 Contract Insights")           
-            st.write(data['procurement_summary'])            
+            render_summary(data, 'procurement_summary')            
+
+            with st.expander("📑 Per-Contract Insights"):
+                if st.button("Generate per-contract insights", use_container_width=True):
+                    contract_status = st.empty()
+                    finished_contracts = []
+
+                    def show_contract_progress(contract, text, error):
+                        finished_contracts.append(contract)
+                        contract_status.caption(f"{len(finished_contracts)} contracts summarized...")
+
+                    with st.spinner("Summarizing each contract..."):
+                        st.session_state.contract_item_insights = get_contract_item_insights(
+                            on_result=show_contract_progress
+                        )
+                    contract_status.empty()
+                if st.session_state.get('contract_item_insights') is not None:
+                    st.dataframe(st.session_state.contract_item_insights, use_container_width=True, hide_index=True)
             
         else:
             st.warning("Procurement analysis data not available. Please run the analysis.")
 
+    with tab5:
+        st.markdown('<h2 class="section-header">Drill-down Explorer</h2>', unsafe_allow_html=True)
+
+        # Filters and grouping are answered from pre-aggregated cells, so widgets respond instantly
+        drilldown = get_drilldown_index()
+        filter_cols = st.columns(3)
+        drill_filters = {}
+        for position, dimension in enumerate(DRILLDOWN_DIMENSIONS + [RECOMMENDATION]):
+            drill_filters[dimension] = filter_cols[position % 3].multiselect(
+                dimension, drilldown.values(dimension), placeholder="All"
+            )
+        group_by = st.multiselect("Group by", DRILLDOWN_DIMENSIONS, default=['Product type'], max_selections=3)
+
+        drill_df = drilldown.query(drill_filters, by=group_by, demand_change=st.session_state.scenario_change)
+        if drill_df.empty:
+            st.info("No SKUs match the selected filters.")
+        else:
+            drill_col1, drill_col2, drill_col3, drill_col4 = st.columns(4)
+            drill_col1.metric("SKUs", int(drill_df['skus'].sum()))
+            drill_col2.metric("❌ Discontinue", int(drill_df['❌ Discontinue'].sum()))
+            drill_col3.metric("Revenue", f"${drill_df['revenue'].sum():,.0f}")
+            drill_col4.metric(
+                f"Revenue at {st.session_state.scenario_change}% demand",
+                f"${drill_df['simulated_revenue'].sum():,.0f}"
+            )
+
+            if group_by:
+                drill_df['group'] = drill_df[group_by].astype(str).agg(' · '.join, axis=1)
+                fig_drill = px.bar(
+                    drill_df,
+                    x='group',
+                    y=['✅ Keep', '♻️ Bundle/Optimize', '❌ Discontinue'],
+                    labels={'value': 'SKUs', 'variable': 'Recommendation', 'group': ' · '.join(group_by)},
+                    title=f"SKU Recommendations by {' · '.join(group_by)}",
+                    color_discrete_map={
+                        '✅ Keep': '#28a745',
+                        '♻️ Bundle/Optimize': '#ffc107',
+                        '❌ Discontinue': '#dc3545'
+                    }
+                )
+                st.plotly_chart(fig_drill, use_container_width=True)
+                drill_df = drill_df.drop(columns='group')
+            st.dataframe(drill_df, use_container_width=True, hide_index=True)
+
+    with tab6:
+        st.markdown('<h2 class="section-header">Pipeline Performance</h2>', unsafe_allow_html=True)
+
+        llm_metrics = get_metrics()
+        perf_col1, perf_col2, perf_col3, perf_col4 = st.columns(4)
+        perf_col1.metric("LLM Calls", llm_metrics['calls'], f"{llm_metrics['errors']} errors", delta_color="inverse")
+        perf_col2.metric("Avg LLM Latency", f"{llm_metrics['avg_latency_s']:.2f}s")
+        perf_col3.metric("Tokens (prompt / completion)", f"{llm_metrics['prompt_tokens']} / {llm_metrics['completion_tokens']}")
+        peak_rss = instrumentation.peak_rss_mb()
+        perf_col4.metric("Peak RSS", f"{peak_rss:.0f} MB" if peak_rss is not None else "n/a")
+
+        span_totals = instrumentation.span_totals()
+        if span_totals:
+            totals_df = pd.DataFrame.from_dict(span_totals, orient='index').rename_axis('span').reset_index()
+            totals_df['avg_wall_s'] = totals_df['wall_s'] / totals_df['count']
+            totals_df = totals_df.sort_values('wall_s', ascending=False)
+
+            st.subheader("⏱️ Time by Stage")
+            fig_spans = px.bar(
+                totals_df,
+                x='span',
+                y=['wall_s', 'cpu_s'],
+                barmode='group',
+                labels={'value': 'Seconds', 'variable': '', 'span': 'Stage'},
+                title='Total Wall vs CPU Time per Stage'
+            )
+            st.plotly_chart(fig_spans, use_container_width=True)
+            st.dataframe(totals_df, use_container_width=True, hide_index=True)
+
+            st.subheader("🧾 Recent Spans")
+            recent_df = pd.DataFrame(instrumentation.recent_spans(50)[::-1])
+            st.dataframe(recent_df, use_container_width=True, hide_index=True)
+
+            st.download_button(
+                "Download Prometheus metrics",
+                instrumentation.prometheus_text(),
+                file_name="supply_chain_metrics.prom",
+                mime="text/plain"
+            )
+        else:
+            st.info("No timings recorded yet in this server process.")
+
 else:
     # Landing page when no analysis has been run
     st.markdown("---")
@@ -414,4 +676,16 @@ st.markdown(
     </div>
     """,
     unsafe_allow_html=True
-)
\ No newline at end of file
+)
+
+# Phase 2: once the page is drawn, fill narrative placeholders from the job as text arrives
+if analysis_job is not None and pending_summaries:
+    while True:
+        analysis_job = get_job_queue().get(job_id)
+        for key, (text, done) in analysis_job['narratives'].items():
+            if key in pending_summaries and text:
+                pending_summaries[key].markdown(text + ("" if done else " ▌"))
+        if analysis_job['status'] in ('done', 'partial', 'failed'):
+            break
+        time.sleep(0.3)
+    st.session_state.analysis_data = analysis_job['state']
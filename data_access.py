@@ -0,0 +1,254 @@
+import argparse
+import operator
+import os
+import threading
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet storage is optional; the CSV path works without it
+    pa = ds = pq = None
+
+# === Dataset Configuration ===
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'historical data')
+DATA_PATH = os.environ.get('SUPPLY_CHAIN_DATA', os.path.join(DATA_DIR, 'supply_chain_data.csv'))
+PARQUET_DIR = os.environ.get('SUPPLY_CHAIN_PARQUET', os.path.join(DATA_DIR, 'supply_chain_parquet'))
+PARTITION_COLUMNS = ['Product type']
+MEMORY_MAP = os.environ.get('SUPPLY_CHAIN_MEMORY_MAP', '0') == '1'
+# Histories larger than this are aggregated in batches instead of loaded whole
+STREAM_THRESHOLD_BYTES = int(os.environ.get('SUPPLY_CHAIN_STREAM_BYTES', 1024 ** 3))
+STREAM_BATCH_ROWS = int(os.environ.get('SUPPLY_CHAIN_BATCH_ROWS', 250_000))
+
+# Low-cardinality text columns are stored as categoricals; everything else is typed explicitly
+# so pandas never has to infer types from the text. Count columns are float64 rather than
+# int64 so a blank cell in a history parses as NaN instead of failing the whole read.
+CATEGORICAL_COLUMNS = [
+    'Product type', 'Customer demographics', 'Shipping carriers', 'Supplier name',
+    'Location', 'Inspection results', 'Transportation modes', 'Routes',
+]
+# Whole-number counts; parsed as float64 (see above) but integral in every real history
+COUNT_COLUMNS = [
+    'Availability', 'Number of products sold', 'Stock levels', 'Lead times', 'Order quantities',
+    'Shipping times', 'Lead time', 'Production volumes', 'Manufacturing lead time',
+]
+DTYPES = {
+    **{column: 'category' for column in CATEGORICAL_COLUMNS},
+    **{column: 'float64' for column in COUNT_COLUMNS},
+    'SKU': 'string',
+    'Price': 'float64',
+    'Revenue generated': 'float64',
+    'Shipping costs': 'float64',
+    'Manufacturing costs': 'float64',
+    'Defect rates': 'float64',
+    'Costs': 'float64',
+}
+
+# A requested column missing from a history is read from its fallback under the requested name;
+# older exports carry only the supplier 'Lead times'
+COLUMN_FALLBACKS = {'Lead time': 'Lead times'}
+
+_cache = {}
+_lock = threading.Lock()
+
+_FILTER_OPS = {
+    '=': operator.eq, '==': operator.eq, '!=': operator.ne,
+    '<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge,
+}
+
+
+def _parquet_files(dataset_dir):
+    for root, _, files in os.walk(dataset_dir):
+        for name in files:
+            if name.endswith('.parquet'):
+                yield os.path.join(root, name)
+
+
+def _parquet_version(dataset_dir):
+    stats = [os.stat(path) for path in _parquet_files(dataset_dir)]
+    if not stats:
+        return None
+    return f"{max(s.st_mtime_ns for s in stats)}-{len(stats)}-{sum(s.st_size for s in stats)}"
+
+
+def use_parquet(path=None):
+    # The columnar copy is used only when it exists and is at least as new as the CSV
+    if pq is None or path is not None or not os.path.isdir(PARQUET_DIR):
+        return False
+    files = list(_parquet_files(PARQUET_DIR))
+    if not files:
+        return False
+    return not os.path.exists(DATA_PATH) or max(os.stat(f).st_mtime for f in files) >= os.stat(DATA_PATH).st_mtime
+
+
+def data_version(path=None):
+    if use_parquet(path):
+        return 'parquet-' + _parquet_version(PARQUET_DIR)
+    stat = os.stat(path or DATA_PATH)
+    return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+
+def history_columns(path=None):
+    # Header only: the Parquet schema or the CSV's first line
+    if use_parquet(path):
+        return list(ds.dataset(PARQUET_DIR, format='parquet', partitioning='hive').schema.names)
+    return list(pd.read_csv(path or DATA_PATH, nrows=0).columns)
+
+
+def _resolve_columns(columns, available):
+    # -> (columns to read, {requested name: fallback column it is read from})
+    if columns is None:
+        return None, {}
+    aliases = {
+        column: COLUMN_FALLBACKS[column] for column in columns
+        if column not in available and COLUMN_FALLBACKS.get(column) in available
+    }
+    read = [column for column in columns if column not in aliases]
+    return read + [source for source in aliases.values() if source not in read], aliases
+
+
+def _select(df, columns, aliases):
+    if columns is None:
+        return df.copy(deep=False)
+    if aliases:
+        df = df.assign(**{column: df[source] for column, source in aliases.items()})
+    return df[list(columns)]
+
+
+def _apply_filters(df, filters):
+    # Same (column, op, value) conjunction pyarrow accepts, for the CSV fallback
+    mask = pd.Series(True, index=df.index)
+    for column, op, value in filters:
+        if op == 'in':
+            mask &= df[column].isin(value)
+        elif op == 'not in':
+            mask &= ~df[column].isin(value)
+        else:
+            mask &= _FILTER_OPS[op](df[column], value)
+    return df[mask].reset_index(drop=True)
+
+
+def _read(path, columns, filters, memory_map):
+    if use_parquet(path):
+        table = pq.read_table(PARQUET_DIR, columns=columns, filters=filters, memory_map=memory_map)
+        df = table.to_pandas()
+        for column in df.columns.intersection(CATEGORICAL_COLUMNS):
+            if not isinstance(df[column].dtype, pd.CategoricalDtype):
+                df[column] = df[column].astype('category')
+        return df
+    return pd.read_csv(path or DATA_PATH, dtype=DTYPES)
+
+
+def load_supply_chain_data(path=None, columns=None, filters=None, memory_map=MEMORY_MAP):
+    """Return the supply chain dataset, parsed once per file version and shared across agents.
+
+    Reads the partitioned Parquet dataset when it is current, otherwise the CSV.
+    ``columns`` selects columns and ``filters`` is a list of ``(column, op, value)``
+    conditions; Parquet prunes both at read time, while the CSV is parsed whole
+    once per version and every selection is taken from that one frame.
+    The result is a shallow copy: adding columns is private to the caller, but
+    before pandas 3 (no copy-on-write) values are shared with the cached frame,
+    so take an explicit ``.copy()`` before modifying values in place.
+    """
+    version = data_version(path)
+    if use_parquet(path):
+        # Column and partition pruning are cheap here, so each selection is read and cached on its own
+        key = (path, tuple(columns) if columns is not None else None, repr(filters))
+        with _lock:
+            cached = _cache.get(key)
+            if cached is None or cached[0] != version:
+                read, aliases = _resolve_columns(columns, history_columns(path))
+                df = _select(_read(path, read, filters, memory_map), columns, aliases)
+                cached = _cache[key] = (version, df)
+        return cached[1].copy(deep=False)
+
+    # A CSV has to be scanned whole anyway: parse it once per version and select from that
+    key = (path, None, None)
+    with _lock:
+        cached = _cache.get(key)
+        if cached is None or cached[0] != version:
+            cached = _cache[key] = (version, _read(path, None, None, memory_map))
+    df = cached[1]
+    if filters:
+        df = _apply_filters(df, filters)
+    return _select(df, columns, _resolve_columns(columns, df.columns)[1])
+
+
+def clear_cache():
+    with _lock:
+        _cache.clear()
+
+
+# === Out-of-core batches ===
+def history_bytes(path=None):
+    if use_parquet(path):
+        return sum(os.path.getsize(f) for f in _parquet_files(PARQUET_DIR))
+    return os.path.getsize(path or DATA_PATH)
+
+
+def should_stream(path=None):
+    return history_bytes(path) > STREAM_THRESHOLD_BYTES
+
+
+def iter_batches(columns=None, path=None, batch_rows=STREAM_BATCH_ROWS):
+    """Yield the dataset as frames of at most ``batch_rows`` rows, holding one batch in memory at a time.
+
+    Nothing is cached; use with mergeable partial aggregates (see ``merge_partials``).
+    """
+    read, aliases = _resolve_columns(columns, history_columns(path))
+    if use_parquet(path):
+        dataset = ds.dataset(PARQUET_DIR, format='parquet', partitioning='hive')
+        for batch in dataset.to_batches(columns=read, batch_size=batch_rows):
+            yield _select(batch.to_pandas(), columns, aliases)
+        return
+    dtypes = {column: dtype for column, dtype in DTYPES.items() if read is None or column in read}
+    with pd.read_csv(path or DATA_PATH, usecols=read, dtype=dtypes, chunksize=batch_rows) as reader:
+        for batch in reader:
+            yield _select(batch, columns, aliases)
+
+
+def merge_partials(total, part):
+    # Partials are dicts of numbers or nested count dicts; merging sums them key by key
+    if total is None:
+        return part
+    merged = dict(total)
+    for key, value in part.items():
+        if isinstance(value, dict):
+            merged[key] = merge_partials(total.get(key, {}), value)
+        else:
+            merged[key] = total.get(key, 0) + value
+    return merged
+
+
+# === Columnar ingestion ===
+def ingest_csv(csv_path=None, dataset_dir=PARQUET_DIR, partition_cols=PARTITION_COLUMNS):
+    """Convert a CSV drop into the partitioned Parquet dataset.
+
+    Files are named after the CSV, so re-ingesting a drop replaces its files and
+    a new drop is added next to the existing ones.
+    """
+    if pq is None:
+        raise ImportError("pyarrow is required to write the Parquet dataset")
+    csv_path = csv_path or DATA_PATH
+    df = pd.read_csv(csv_path, dtype=DTYPES)
+    stem = os.path.splitext(os.path.basename(csv_path))[0].replace(' ', '_')
+    pq.write_to_dataset(
+        pa.Table.from_pandas(df, preserve_index=False),
+        dataset_dir,
+        partition_cols=partition_cols,
+        basename_template=f"{stem}-{{i}}.parquet",
+        existing_data_behavior='overwrite_or_ignore',
+    )
+    clear_cache()
+    return len(df)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert supply chain CSV drops to partitioned Parquet")
+    parser.add_argument('csv', nargs='*', default=[DATA_PATH])
+    parser.add_argument('--out', default=PARQUET_DIR)
+    args = parser.parse_args()
+    for csv_path in args.csv:
+        print(f"{csv_path}: {ingest_csv(csv_path, args.out)} rows -> {args.out}")
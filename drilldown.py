@@ -0,0 +1,141 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+import data_access
+from scenario_planning import unit_revenue
+from sku_rationalization import SKU_LABELS, add_sku_metrics, classify_skus
+
+# === Drill-down Configuration ===
+DRILLDOWN_DIMENSIONS = [
+    'Product type', 'Supplier name', 'Location', 'Shipping carriers', 'Transportation modes', 'Routes',
+]
+RECOMMENDATION = 'SKU Recommendation'
+DRILLDOWN_COLUMNS = DRILLDOWN_DIMENSIONS + [
+    'Revenue generated', 'Manufacturing costs', 'Number of products sold', 'Stock levels',
+    'Defect rates', 'Lead time', 'Shipping costs',
+]
+# Measures kept per cell as sums, with a non-null count for each averaged one
+MEAN_MEASURES = {
+    'avg_profit_margin': 'Profit Margin',
+    'avg_sales_velocity': 'Sales Velocity',
+    'avg_defect_rate': 'Defect rates',
+    'avg_lead_time': 'Lead time',
+    'avg_shipping_cost': 'Shipping costs',
+}
+
+_engines = {}
+_lock = threading.Lock()
+
+
+def cell_aggregates(batch, thresholds=None):
+    """Reduce rows to one line per combination of the six dimensions and the SKU recommendation."""
+    metrics = add_sku_metrics(batch)
+    keys = metrics[DRILLDOWN_DIMENSIONS].astype(str)
+    keys[RECOMMENDATION] = np.asarray(classify_skus(metrics, thresholds), dtype=object)
+    values = pd.DataFrame({'skus': 1, 'revenue': metrics['Revenue generated'], 'unit_revenue': unit_revenue(metrics)})
+    for name, column in MEAN_MEASURES.items():
+        values[name + '_sum'] = metrics[column]
+        values[name + '_count'] = metrics[column].notna().astype('int64')
+    return pd.concat([keys, values], axis=1).groupby(list(keys.columns), sort=False).sum(min_count=0).reset_index()
+
+
+class DrillDownIndex:
+    """Pre-aggregated cells over every drill-down dimension, queried with integer-code masks.
+
+    Each dimension (plus the SKU recommendation) is stored as a code array over
+    the cells, so filtering is ``np.isin`` on codes and grouping is a bincount;
+    no query touches the row-level data.
+    """
+
+    def __init__(self, cells):
+        self.n_cells = len(cells)
+        self.codes, self.levels = {}, {}
+        for column in DRILLDOWN_DIMENSIONS + [RECOMMENDATION]:
+            codes, levels = pd.factorize(cells[column], sort=True)
+            self.codes[column] = codes
+            self.levels[column] = list(levels)
+        self.measures = {
+            column: cells[column].to_numpy(dtype='float64')
+            for column in cells.columns if column not in self.codes
+        }
+
+    @classmethod
+    def from_frame(cls, df, thresholds=None):
+        return cls(cell_aggregates(df, thresholds))
+
+    @classmethod
+    def from_batches(cls, batches, thresholds=None):
+        # Cells are merged after every batch, so memory is bounded by batch size + cell count
+        cells = None
+        for batch in batches:
+            part = cell_aggregates(batch, thresholds)
+            cells = part if cells is None else (
+                pd.concat([cells, part]).groupby(DRILLDOWN_DIMENSIONS + [RECOMMENDATION], sort=False).sum().reset_index()
+            )
+        return cls(cells)
+
+    def values(self, dimension):
+        return self.levels[dimension]
+
+    def _mask(self, filters):
+        mask = np.ones(self.n_cells, dtype=bool)
+        for column, selected in (filters or {}).items():
+            if not selected:
+                continue
+            wanted = [self.levels[column].index(value) for value in selected if value in self.levels[column]]
+            mask &= np.isin(self.codes[column], wanted)
+        return mask
+
+    def query(self, filters=None, by=(), demand_change=0.0):
+        """Aggregate the cells matching ``filters`` ({dimension: [values]}) grouped by the ``by`` dimensions.
+
+        Returns one row per group with SKU counts per recommendation, revenue,
+        simulated revenue at ``demand_change`` % and the averaged SKU metrics.
+        """
+        by = list(by)
+        mask = self._mask(filters)
+        if by:
+            shape = [len(self.levels[column]) for column in by]
+            group_ids = np.ravel_multi_index([self.codes[column][mask] for column in by], shape)
+        else:
+            shape, group_ids = [1], np.zeros(int(mask.sum()), dtype='int64')
+        n_groups = int(np.prod(shape))
+
+        def total(measure):
+            return np.bincount(group_ids, weights=self.measures[measure][mask], minlength=n_groups)
+
+        skus = total('skus')
+        result = pd.DataFrame(index=np.arange(n_groups))
+        for position, column in enumerate(by):
+            level_codes = np.unravel_index(np.arange(n_groups), shape)[position]
+            result[column] = np.asarray(self.levels[column], dtype=object)[level_codes]
+        result['skus'] = skus.astype('int64')
+        recommendations = self.codes[RECOMMENDATION][mask]
+        for label in SKU_LABELS:
+            code = self.levels[RECOMMENDATION].index(label) if label in self.levels[RECOMMENDATION] else -1
+            weights = (recommendations == code) * self.measures['skus'][mask]
+            result[label] = np.bincount(group_ids, weights=weights, minlength=n_groups).astype('int64')
+        result['revenue'] = total('revenue')
+        result['simulated_revenue'] = (1 + demand_change / 100) * total('unit_revenue')
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for name in MEAN_MEASURES:
+                result[name] = total(name + '_sum') / total(name + '_count')
+        return result[skus > 0].reset_index(drop=True)
+
+
+def get_drilldown_index(path=None, thresholds=None):
+    """Return the drill-down index for the current data version, building it on first use."""
+    version = data_access.data_version(path)
+    key = (path, tuple(sorted((thresholds or {}).items())))
+    with _lock:
+        cached = _engines.get(key)
+        if cached is None or cached[0] != version:
+            if data_access.should_stream(path):
+                index = DrillDownIndex.from_batches(data_access.iter_batches(DRILLDOWN_COLUMNS, path), thresholds)
+            else:
+                df = data_access.load_supply_chain_data(path, columns=DRILLDOWN_COLUMNS)
+                index = DrillDownIndex.from_frame(df, thresholds)
+            cached = _engines[key] = (version, index)
+    return cached[1]
@@ -0,0 +1,249 @@
+import contextvars
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    import resource
+except ImportError:  # Windows: peak RSS is not reported
+    resource = None
+
+# === Tracing Configuration ===
+TRACE_HISTORY = int(os.environ.get('TRACE_HISTORY', 2000))
+TRACE_LOG_PATH = os.environ.get('TRACE_LOG_PATH')  # optional JSON-lines file of finished spans
+METRICS_PORT = os.environ.get('TRACE_METRICS_PORT')  # optional Prometheus /metrics endpoint
+
+logger = logging.getLogger('supply_chain.trace')
+if TRACE_LOG_PATH:
+    _handler = logging.FileHandler(TRACE_LOG_PATH)
+    _handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+
+_current = contextvars.ContextVar('trace_span', default=None)
+_lock = threading.Lock()
+_counter_lock = threading.Lock()  # spans on several threads add to the same parents
+_spans = deque(maxlen=TRACE_HISTORY)
+_totals = {}
+
+COUNTERS = ('prompt_tokens', 'completion_tokens', 'cache_hits', 'cache_misses', 'llm_calls')
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    # ru_maxrss is kilobytes on Linux and bytes on macOS
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+
+def rss_mb():
+    # Current resident set size; read from /proc, so Linux only
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+
+
+def _difference(end, start):
+    return None if end is None or start is None else end - start
+
+
+class Span:
+    """One timed stage. Counters recorded inside it (tokens, cache hits) are also added to its parents.
+
+    Memory is recorded as RSS at start and end plus how far the stage raised the
+    process peak; both are process-wide, so concurrent stages blur into each other.
+    """
+
+    def __init__(self, name, parent=None, **attrs):
+        self.name = name
+        self.parent = parent
+        self.path = f"{parent.path}/{name}" if parent else name
+        self.attrs = attrs
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.error = None
+
+    def add(self, **counters):
+        with _counter_lock:
+            span = self
+            while span is not None:
+                for key, value in counters.items():
+                    span.counters[key] += value
+                span = span.parent
+
+    def __enter__(self):
+        self._token = _current.set(self)
+        self._wall = time.perf_counter()
+        self._cpu = time.thread_time()
+        self._rss = rss_mb()
+        self._peak = peak_rss_mb()
+        self.started_at = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.wall_s = time.perf_counter() - self._wall
+        self.cpu_s = time.thread_time() - self._cpu
+        self.rss_end = rss_mb()
+        self.peak_growth = _difference(peak_rss_mb(), self._peak)
+        if exc is not None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        _current.reset(self._token)
+        _finish(self)
+        return False
+
+    def record(self):
+        return {
+            'name': self.name,
+            'path': self.path,
+            'started_at': self.started_at,
+            'wall_s': self.wall_s,
+            'cpu_s': self.cpu_s,
+            'rss_start_mb': self._rss,
+            'rss_end_mb': self.rss_end,
+            'rss_delta_mb': _difference(self.rss_end, self._rss),
+            'peak_growth_mb': self.peak_growth,
+            'thread': threading.current_thread().name,
+            'error': self.error,
+            **self.counters,
+            **self.attrs,
+        }
+
+
+def span(name, **attrs):
+    """Time a block: ``with span('sku.classify'):``. Nested spans record their parent path."""
+    return Span(name, _current.get(), **attrs)
+
+
+def traced(name):
+    """Decorator form of ``span`` for whole functions."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def record_llm(cached, prompt_tokens=0, completion_tokens=0):
+    # Called by llm_client for every generate; attributed to the enclosing spans
+    active = _current.get()
+    if active is None:
+        return
+    if cached:
+        active.add(cache_hits=1)
+    else:
+        active.add(cache_misses=1, llm_calls=1, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+
+
+def annotate(**attrs):
+    # Attach extra fields (e.g. row counts, stage timings) to the enclosing span
+    active = _current.get()
+    if active is not None:
+        active.attrs.update(attrs)
+
+
+def _finish(finished):
+    record = finished.record()
+    with _lock:
+        _spans.append(record)
+        totals = _totals.setdefault(finished.name, {
+            'count': 0, 'errors': 0, 'wall_s': 0.0, 'cpu_s': 0.0, 'max_wall_s': 0.0, 'last_wall_s': 0.0,
+            'peak_growth_mb': 0.0,
+            **dict.fromkeys(COUNTERS, 0),
+        })
+        totals['count'] += 1
+        totals['errors'] += finished.error is not None
+        totals['wall_s'] += finished.wall_s
+        totals['cpu_s'] += finished.cpu_s
+        totals['max_wall_s'] = max(totals['max_wall_s'], finished.wall_s)
+        totals['last_wall_s'] = finished.wall_s
+        totals['peak_growth_mb'] += finished.peak_growth or 0.0
+        for key in COUNTERS:
+            totals[key] += finished.counters[key]
+    logger.info(json.dumps(record, default=str))
+
+
+# === Reporting ===
+def recent_spans(limit=None):
+    with _lock:
+        spans = list(_spans)
+    return spans[-limit:] if limit else spans
+
+
+def span_totals():
+    with _lock:
+        return {name: dict(totals) for name, totals in _totals.items()}
+
+
+def reset():
+    with _lock:
+        _spans.clear()
+        _totals.clear()
+
+
+def prometheus_text():
+    """Span totals in the Prometheus text exposition format."""
+    totals = span_totals()
+    metrics = [
+        ('supply_chain_span_count', 'counter', 'Finished spans', 'count'),
+        ('supply_chain_span_errors', 'counter', 'Spans that raised', 'errors'),
+        ('supply_chain_span_wall_seconds', 'counter', 'Total wall time', 'wall_s'),
+        ('supply_chain_span_cpu_seconds', 'counter', 'Total thread CPU time', 'cpu_s'),
+        ('supply_chain_span_peak_growth_megabytes', 'counter', 'Growth of the process peak RSS during the span', 'peak_growth_mb'),
+        ('supply_chain_span_llm_calls', 'counter', 'LLM calls sent to Ollama', 'llm_calls'),
+        ('supply_chain_span_prompt_tokens', 'counter', 'LLM prompt tokens', 'prompt_tokens'),
+        ('supply_chain_span_completion_tokens', 'counter', 'LLM completion tokens', 'completion_tokens'),
+        ('supply_chain_span_cache_hits', 'counter', 'LLM response cache hits', 'cache_hits'),
+        ('supply_chain_span_cache_misses', 'counter', 'LLM response cache misses', 'cache_misses'),
+    ]
+    lines = []
+    for metric, kind, help_text, field in metrics:
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} {kind}")
+        for name, values in sorted(totals.items()):
+            lines.append(f'{metric}{{span="{name}"}} {values[field]}')
+    rss = peak_rss_mb()
+    if rss is not None:
+        lines.append("# HELP supply_chain_peak_rss_megabytes Peak resident set size of the process")
+        lines.append("# TYPE supply_chain_peak_rss_megabytes gauge")
+        lines.append(f"supply_chain_peak_rss_megabytes {rss}")
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != '/metrics':
+            self.send_error(404)
+            return
+        body = prometheus_text().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+_server = None
+
+
+def start_metrics_server(port=None):
+    """Serve ``/metrics`` on a background thread; returns the server (started once per process)."""
+    global _server
+    with _lock:
+        if _server is None:
+            _server = ThreadingHTTPServer(('127.0.0.1', int(port or METRICS_PORT or 9464)), _MetricsHandler)
+            threading.Thread(target=_server.serve_forever, name='trace-metrics', daemon=True).start()
+    return _server
@@ -0,0 +1,86 @@
+import contextvars
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from instrumentation import annotate, span
+from llm_cache import cache_key
+from llm_client import DEFAULT_MODEL, MAX_CONCURRENCY, generate
+
+# === Batch Configuration ===
+# Prompts in flight at once; llm_client's semaphore caps real Ollama calls at MAX_CONCURRENCY,
+# which follows the server's OLLAMA_NUM_PARALLEL, so more threads would only wait
+BATCH_PARALLELISM = MAX_CONCURRENCY
+QUEUE_DEPTH = 2              # prompts queued per worker, so a closed batch leaves little work behind
+
+
+def coalesce(prompts, model=DEFAULT_MODEL, options=None):
+    """Group identical prompts: returns ``[(prompt, [index, ...]), ...]`` in first-seen order."""
+    groups = {}
+    for index, prompt in enumerate(prompts):
+        key = cache_key(prompt, model, options)
+        if key not in groups:
+            groups[key] = (prompt, [])
+        groups[key][1].append(index)
+    return list(groups.values())
+
+
+def iter_batch(prompts, model=DEFAULT_MODEL, options=None, parallelism=None, use_cache=True):
+    """Yield ``(index, text, error)`` for every prompt as soon as its completion is ready.
+
+    Identical prompts are sent once and reported under each of their indices.
+    A failed prompt yields its exception as ``error`` (and ``text`` None) without
+    stopping the batch. Closing the generator cancels prompts not yet started.
+    """
+    groups = coalesce(prompts, model, options)
+    if not groups:
+        return
+    workers = max(1, min(parallelism or BATCH_PARALLELISM, len(groups)))
+    annotate(unique_prompts=len(groups))
+    # Workers run in the caller's context so tokens and cache hits count towards its span
+    context = contextvars.copy_context()
+    pending = {}
+    remaining = iter(groups)
+
+    def submit_next():
+        for prompt, indices in remaining:
+            future = executor.submit(context.copy().run, generate, prompt, model, options, use_cache=use_cache)
+            pending[future] = indices
+            return
+
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='llm-batch')
+    try:
+        for _ in range(workers * QUEUE_DEPTH):
+            submit_next()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                indices = pending.pop(future)
+                submit_next()
+                try:
+                    text, error = future.result(), None
+                except Exception as e:
+                    text, error = None, e
+                for index in indices:
+                    yield index, text, error
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+
+def generate_batch(prompts, model=DEFAULT_MODEL, options=None, parallelism=None, use_cache=True, on_result=None):
+    """Run every prompt and return the texts in input order (None where a prompt failed).
+
+    ``on_result(index, text, error)`` is called as each result arrives, for
+    callers that show partial results while the rest of the batch runs.
+    """
+    prompts = list(prompts)
+    results = [None] * len(prompts)
+    with span('llm.batch', prompts=len(prompts), parallelism=parallelism or BATCH_PARALLELISM):
+        failed = 0
+        for index, text, error in iter_batch(prompts, model, options, parallelism, use_cache):
+            results[index] = text
+            failed += error is not None
+            if on_result is not None:
+                on_result(index, text, error)
+        annotate(failed=failed)
+    return results
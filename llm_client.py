@@ -0,0 +1,213 @@
+import json
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from instrumentation import record_llm, span
+from llm_cache import cache_key, get_response_cache
+
+# === Ollama Client Configuration ===
+OLLAMA_HOST = os.environ.get('OLLAMA_HOST', 'http://localhost:11434')
+if not OLLAMA_HOST.startswith(('http://', 'https://')):
+    OLLAMA_HOST = 'http://' + OLLAMA_HOST
+DEFAULT_MODEL = os.environ.get('OLLAMA_MODEL', 'tinyllama')
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = float(os.environ.get('OLLAMA_TIMEOUT', 120))
+# Defaults to the server's own parallel-request setting when that is exported here too
+MAX_CONCURRENCY = int(os.environ.get('OLLAMA_MAX_CONCURRENCY', os.environ.get('OLLAMA_NUM_PARALLEL', 2)))
+MAX_RETRIES = 2
+BACKOFF_SECONDS = 0.5
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class LLMError(RuntimeError):
+    pass
+
+
+_session = None
+_session_lock = threading.Lock()
+_semaphore = threading.BoundedSemaphore(MAX_CONCURRENCY)
+_metrics_lock = threading.Lock()
+
+
+def _empty_metrics():
+    return {
+        'calls': 0, 'errors': 0, 'retries': 0,
+        'total_latency_s': 0.0, 'last_latency_s': 0.0, 'last_first_token_s': 0.0,
+        'prompt_tokens': 0, 'completion_tokens': 0,
+    }
+
+
+_metrics = _empty_metrics()
+
+
+def get_session():
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=MAX_CONCURRENCY)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                _session = session
+    return _session
+
+
+def _record(**updates):
+    with _metrics_lock:
+        for key, value in updates.items():
+            if key.startswith('last_'):
+                _metrics[key] = value
+            else:
+                _metrics[key] += value
+
+
+def get_metrics():
+    with _metrics_lock:
+        metrics = dict(_metrics)
+    metrics['avg_latency_s'] = metrics['total_latency_s'] / metrics['calls'] if metrics['calls'] else 0.0
+    return metrics
+
+
+def reset_metrics():
+    global _metrics
+    with _metrics_lock:
+        _metrics = _empty_metrics()
+
+
+def generate(prompt, model=DEFAULT_MODEL, options=None, timeout=READ_TIMEOUT, retries=MAX_RETRIES,
+             use_cache=True):
+    """Run one non-streaming Ollama completion and return the response text.
+
+    Responses are served from the persistent cache when the same model, options
+    and prompt were seen before. Calls share one pooled session, at most
+    ``MAX_CONCURRENCY`` run at once, and connection errors, timeouts and 429/5xx
+    responses are retried with exponential backoff. Raises ``LLMError`` once
+    retries are exhausted or on other HTTP errors.
+    """
+    key = cache_key(prompt, model, options)
+    if use_cache:
+        cached = get_response_cache().get(key)
+        if cached is not None:
+            record_llm(cached=True)
+            return cached
+
+    with span('llm.generate', model=model):
+        text = _post_generate(prompt, model, options, timeout, retries)
+    if use_cache and text:
+        get_response_cache().put(key, model, text)
+    return text
+
+
+def _open_response(payload, timeout, retries):
+    # Retries only cover getting a response; streamed bodies are never replayed
+    last_error = None
+    for attempt in range(retries + 1):
+        if attempt:
+            _record(retries=1)
+            time.sleep(BACKOFF_SECONDS * 2 ** (attempt - 1))
+        try:
+            response = get_session().post(
+                f"{OLLAMA_HOST}/api/generate", json=payload,
+                timeout=(CONNECT_TIMEOUT, timeout), stream=payload["stream"],
+            )
+            if response.status_code in RETRY_STATUS_CODES:
+                response.close()
+                last_error = LLMError(f"Ollama returned HTTP {response.status_code}")
+                continue
+            response.raise_for_status()
+            return response
+        except (requests.ConnectionError, requests.Timeout) as e:
+            last_error = e
+        except requests.RequestException as e:
+            _record(errors=1)
+            raise LLMError(f"Ollama request failed: {e}") from e
+
+    _record(errors=1)
+    raise LLMError(f"Ollama request failed after {retries + 1} attempts: {last_error}") from last_error
+
+
+def _post_generate(prompt, model, options, timeout, retries):
+    payload = {"model": model, "prompt": prompt, "stream": False}
+    if options:
+        payload["options"] = options
+
+    with _semaphore:
+        start = time.perf_counter()
+        response = _open_response(payload, timeout, retries)
+        try:
+            body = response.json()
+        except ValueError as e:
+            _record(errors=1)
+            raise LLMError(f"Ollama returned invalid JSON: {e}") from e
+        latency = time.perf_counter() - start
+
+    _record(
+        calls=1, total_latency_s=latency, last_latency_s=latency,
+        prompt_tokens=body.get('prompt_eval_count', 0), completion_tokens=body.get('eval_count', 0),
+    )
+    record_llm(False, body.get('prompt_eval_count', 0), body.get('eval_count', 0))
+    return body.get('response', '').strip()
+
+
+def generate_stream(prompt, model=DEFAULT_MODEL, options=None, timeout=READ_TIMEOUT, retries=MAX_RETRIES,
+                    use_cache=True):
+    """Yield the completion piece by piece as Ollama produces it.
+
+    A cached response is yielded whole. The concurrency slot is held until the
+    stream is exhausted or closed, and the finished text is written to the cache.
+    """
+    key = cache_key(prompt, model, options)
+    if use_cache:
+        cached = get_response_cache().get(key)
+        if cached is not None:
+            record_llm(cached=True)
+            yield cached
+            return
+
+    payload = {"model": model, "prompt": prompt, "stream": True}
+    if options:
+        payload["options"] = options
+
+    pieces, body, first_token = [], {}, None
+    with _semaphore:
+        start = time.perf_counter()
+        response = _open_response(payload, timeout, retries)
+        try:
+            with response:
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    body = json.loads(line)
+                    if body.get('error'):
+                        raise LLMError(f"Ollama stream failed: {body['error']}")
+                    piece = body.get('response', '')
+                    if not pieces:
+                        piece = piece.lstrip()
+                    if piece:
+                        if first_token is None:
+                            first_token = time.perf_counter() - start
+                        pieces.append(piece)
+                        yield piece
+                    if body.get('done'):
+                        break
+        except (requests.RequestException, ValueError, LLMError) as e:
+            _record(errors=1)
+            if isinstance(e, LLMError):
+                raise
+            raise LLMError(f"Ollama stream failed: {e}") from e
+        latency = time.perf_counter() - start
+
+    _record(
+        calls=1, total_latency_s=latency, last_latency_s=latency, last_first_token_s=first_token or latency,
+        prompt_tokens=body.get('prompt_eval_count', 0), completion_tokens=body.get('eval_count', 0),
+    )
+    # A generator cannot own a span across yields; tokens go to whichever span is consuming the stream
+    record_llm(False, body.get('prompt_eval_count', 0), body.get('eval_count', 0))
+    text = ''.join(pieces).strip()
+    if use_cache and text:
+        get_response_cache().put(key, model, text)
@@ -1,10 +1,25 @@
-import requests
-from llama_index.core import SimpleDirectoryReader
-from llama_index.core.node_parser import SentenceSplitter
-from sentence_transformers import SentenceTransformer
-import faiss
-import numpy as np
+import itertools
+
 import pandas as pd
+from contract_index import load_contract_index, encode_queries
+from llm_client import generate, generate_stream
+from llm_batch import generate_batch
+from instrumentation import annotate, span
+from prompt_builder import estimate_tokens, truncate_to_tokens
+
+# === Retrieval Configuration ===
+# Topic -> search query run against the contract index to pick prompt context
+RETRIEVAL_QUERIES = {
+    'Payment Terms': "payment terms, invoicing schedule, late payment interest and fees",
+    'Liability': "limitation of liability, indemnification and damages caps",
+    'Termination': "termination for cause or convenience, notice period and exit obligations",
+    'Service Levels': "service levels, delivery obligations, performance standards and remedies",
+    'Compliance': "compliance with laws, confidentiality, data protection and audit rights",
+    'Warranties': "warranties, defects, acceptance and inspection of goods or services",
+}
+TOP_K_PER_QUERY = 3
+CONTEXT_TOKEN_BUDGET = 1500
+CONTRACT_ITEM_TOKEN_BUDGET = 800   # context per contract for per-contract insights
 
 def get_procurement_structured_data():
     return {
@@ -14,24 +29,49 @@ def get_procurement_structured_data():
         'analysis_timestamp': pd.Timestamp.now().strftime('%Y-%m-%d %H:%M:%S')
     }
 
-def get_procurement_summary() -> str:
-    # Step 1: Load and chunk documents
-    documents = SimpleDirectoryReader("./contracts").load_data()
-    splitter = SentenceSplitter(chunk_size=1024, chunk_overlap=100)
-    nodes = splitter.get_nodes_from_documents(documents)
-    texts = [node.text for node in nodes]
-
-    # Step 2: Generate embeddings and FAISS index
-    model = SentenceTransformer('all-MiniLM-L6-v2')
-    embeddings = model.encode(texts)
-    dimension = embeddings[0].shape[0]
-    index = faiss.IndexFlatL2(dimension)
-    index.add(np.array(embeddings))
-    text_id_map = {i: text for i, text in enumerate(texts)}
-
-    # Step 3: Generate LLM Summary
-    context = "\n\n".join(text_id_map.values())[:3000]
-    prompt = f"""
+def retrieve_context(contract_index, queries=None, top_k=TOP_K_PER_QUERY, token_budget=CONTEXT_TOKEN_BUDGET):
+    """Pick chunks per topic query, best matches first, until the token budget is spent.
+
+    Topics take turns by rank so every topic gets its best chunk before any topic
+    gets its second. Each excerpt is cut to an equal share of the budget, since a
+    whole index chunk (CHUNK_SIZE) would use it up on its own. Returns
+    ``{topic: [chunk, ...]}`` in query order.
+    """
+    queries = RETRIEVAL_QUERIES if queries is None else queries
+    topics = list(queries)
+    with span('procurement.encode_queries', queries=len(topics)):
+        query_vectors = encode_queries(queries.values())
+    with span('procurement.faiss_search', top_k=top_k, vectors=len(contract_index)):
+        hits = contract_index.search(query_vectors, top_k)
+
+    excerpt_tokens = token_budget // max(len(topics), 1)
+    selected = {topic: [] for topic in topics}
+    seen_ids = set()
+    used_tokens = 0
+    for rank in range(top_k):
+        for topic, topic_hits in zip(topics, hits):
+            if rank >= len(topic_hits):
+                continue
+            chunk_id, _ = topic_hits[rank]
+            if chunk_id in seen_ids:
+                continue
+            chunk = contract_index.get_chunk(chunk_id)
+            chunk = {**chunk, 'text': truncate_to_tokens(chunk['text'], excerpt_tokens)}
+            cost = estimate_tokens(chunk['text'])
+            if used_tokens + cost > token_budget:
+                continue
+            seen_ids.add(chunk_id)
+            used_tokens += cost
+            selected[topic].append(chunk)
+    return {topic: chunks for topic, chunks in selected.items() if chunks}
+
+def build_procurement_prompt(selected):
+    sections = []
+    for topic, chunks in selected.items():
+        excerpts = "\n".join(f"[{chunk['source']}] {chunk['text'].strip()}" for chunk in chunks)
+        sections.append(f"### {topic}\n{excerpts}")
+    context = "\n\n".join(sections)
+    return f"""
 You are a supply chain legal assistant. Based on the following context from procurement contracts, summarize key terms, risks, and decision points.
 
 📄 Context:
@@ -39,9 +79,64 @@ You are a supply chain legal assistant. Based on the following context from proc
 
 🎯 Summary:"""
 
-    response = requests.post(
-        "http://localhost:11434/api/generate",
-        json={"model": "tinyllama", "prompt": prompt, "stream": False}
-    )
-    return response.json().get("response", "").strip()
+def get_procurement_summary(queries=None, top_k=TOP_K_PER_QUERY, token_budget=CONTEXT_TOKEN_BUDGET, stream=False):
+    # Step 1 & 2: Sync chunks and FAISS index (only added/changed contracts are embedded)
+    with span('procurement.index_sync'):
+        contract_index = load_contract_index("./contracts")
+        # Parse / embed / FAISS timings from the sync itself
+        annotate(**contract_index.timings)
+
+    # Step 3: Retrieve the most relevant chunks per risk/term topic
+    with span('procurement.retrieve'):
+        selected = retrieve_context(contract_index, queries, top_k, token_budget)
+
+    # Step 4: Generate LLM Summary
+    prompt = build_procurement_prompt(selected)
+    annotate(prompt_chars=len(prompt))
+
+    if stream:
+        return generate_stream(prompt)
+    return generate(prompt)
+
+
+
+# === Per-contract insights, sent as one LLM batch ===
+def contract_item_context(contract_index, token_budget=CONTRACT_ITEM_TOKEN_BUDGET):
+    """Each contract's opening chunks up to ``token_budget``: ``[(contract, [chunk, ...]), ...]``."""
+    contracts = []
+    for source, chunks in itertools.groupby(contract_index.iter_chunks(), key=lambda item: item[1]['source']):
+        selected, used_tokens = [], 0
+        for _, chunk in chunks:
+            cost = estimate_tokens(chunk['text'])
+            if selected and used_tokens + cost > token_budget:
+                break
+            selected.append(chunk)
+            used_tokens += cost
+        contracts.append((source, selected))
+    return contracts
+
+def build_contract_item_prompt(source, chunks):
+    excerpts = "\n".join(chunk['text'].strip() for chunk in chunks)
+    return f"""
+You are a supply chain legal assistant. Based on the following excerpt from the procurement contract {source}, list its key terms, risks and decision points in 3-5 bullet points.
+
+📄 Context:
+{excerpts}
+
+🎯 Summary:"""
+
+def get_contract_item_insights(token_budget=CONTRACT_ITEM_TOKEN_BUDGET, on_result=None):
+    """One LLM insight per contract; returns a frame of contract name and insight.
 
+    ``on_result(contract, text, error)`` receives each insight as it arrives;
+    failed prompts leave the contract's insight as None.
+    """
+    with span('procurement.index_sync'):
+        contract_index = load_contract_index("./contracts")
+    contracts = contract_item_context(contract_index, token_budget)
+    prompts = [build_contract_item_prompt(source, chunks) for source, chunks in contracts]
+    report = None
+    if on_result is not None:
+        report = lambda position, text, error: on_result(contracts[position][0], text, error)
+    insights = generate_batch(prompts, on_result=report)
+    return pd.DataFrame({'Contract': [source for source, _ in contracts], 'Insight': insights})
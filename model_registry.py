@@ -0,0 +1,49 @@
+import threading
+
+from sentence_transformers import SentenceTransformer
+
+# === Process-wide embedding model registry ===
+# Modules stay imported across Streamlit reruns, so models held here are loaded
+# once per server process and shared by every session and worker thread.
+DEFAULT_EMBEDDING_MODEL = 'all-MiniLM-L6-v2'
+
+_models = {}
+_lock = threading.Lock()
+
+
+def get_embedding_model(name=DEFAULT_EMBEDDING_MODEL):
+    model = _models.get(name)
+    if model is None:
+        with _lock:
+            model = _models.get(name)
+            if model is None:
+                model = _models[name] = SentenceTransformer(name)
+    return model
+
+
+def warm_up(names=(DEFAULT_EMBEDDING_MODEL,), background=False):
+    """Load ``names`` ahead of the first request; with ``background`` return immediately."""
+    if background:
+        thread = threading.Thread(target=warm_up, args=(names,), name='model-warm-up', daemon=True)
+        thread.start()
+        return thread
+    for name in names:
+        get_embedding_model(name)
+
+
+def evict_model(name=None):
+    """Drop one model (or all with ``None``) so the next request reloads it."""
+    with _lock:
+        if name is None:
+            _models.clear()
+        else:
+            _models.pop(name, None)
+
+
+def reload_model(name=DEFAULT_EMBEDDING_MODEL):
+    evict_model(name)
+    return get_embedding_model(name)
+
+
+def loaded_models():
+    return sorted(_models)
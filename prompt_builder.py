@@ -0,0 +1,139 @@
+import numpy as np
+import pandas as pd
+
+# === Prompt Budget Configuration ===
+DEFAULT_TOKEN_BUDGET = 450
+DIGEST_ROWS = 3              # rows per top/bottom list before the budget trims them
+
+
+def estimate_tokens(text):
+    # Rough English-text heuristic; good enough to keep the prompt under budget
+    return len(text) // 4 + 1
+
+
+def truncate_to_tokens(text, max_tokens):
+    # Cut at a word boundary so that estimate_tokens(result) <= max_tokens
+    max_chars = max(max_tokens - 1, 0) * 4
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    return cut[:cut.rfind(' ')] if ' ' in cut else cut
+
+
+def extreme_rows(df, column, n=DIGEST_ROWS, largest=True):
+    """Positions of the ``n`` largest (or smallest) non-NaN values of ``column``, best first.
+
+    Uses a partial sort (argpartition), so cost is linear in the number of rows;
+    ties are broken by row position so the digest is deterministic.
+    """
+    values = df[column].to_numpy(dtype='float64')
+    candidates = np.flatnonzero(~np.isnan(values))
+    if len(candidates) == 0:
+        return candidates
+    keyed = -values[candidates] if largest else values[candidates]
+    if len(candidates) > n:
+        picked = np.argpartition(keyed, n - 1)[:n]
+        # Rows tied with the n-th value may sit on either side of the partition; take them all, then trim
+        cutoff = keyed[picked].max()
+        candidates, keyed = candidates[keyed <= cutoff], keyed[keyed <= cutoff]
+    order = np.lexsort((candidates, keyed))
+    return candidates[order][:n]
+
+
+def format_row(row, label_column, columns):
+    # "SKU12: Profit Margin 0.31, Sales Velocity 1.20"
+    values = ", ".join(f"{column} {row[column]:.2f}" for column in columns)
+    return f"- {row[label_column]}: {values}"
+
+
+def segment_partial(df, by, columns, count_column=None):
+    """Per-segment row count, column sums and non-NaN counts (and label counts of ``count_column``).
+
+    Partials of separate batches merge with ``data_access.merge_partials``.
+    """
+    grouped = df.groupby(by, observed=True, sort=True)
+    sums = grouped[columns].sum()
+    non_null = grouped[columns].count()
+    sizes = grouped.size()
+    counts = None
+    if count_column is not None:
+        counts = pd.crosstab(df[by], df[count_column])
+        if isinstance(df[count_column].dtype, pd.CategoricalDtype):
+            counts = counts.reindex(columns=df[count_column].cat.categories, fill_value=0)
+    segments = {}
+    for segment, size in sizes.items():
+        segments[str(segment)] = {
+            'rows': int(size),
+            'sums': {column: float(sums.at[segment, column]) for column in columns},
+            'counts': {column: int(non_null.at[segment, column]) for column in columns},
+        }
+        if counts is not None:
+            segments[str(segment)]['labels'] = {str(label): int(n) for label, n in counts.loc[segment].items()}
+    return segments
+
+
+def segment_lines_from_partial(segments, columns):
+    lines = []
+    for segment in sorted(segments):
+        stats = segments[segment]
+        detail = ", ".join(
+            f"avg {column} {stats['sums'][column] / stats['counts'][column] if stats['counts'][column] else np.nan:.2f}"
+            for column in columns
+        )
+        if 'labels' in stats:
+            detail += "; " + ", ".join(f"{label} {n}" for label, n in stats['labels'].items() if n)
+        lines.append(f"- {segment}: {stats['rows']} rows, {detail}")
+    return lines
+
+
+def segment_lines(df, by, columns, count_column=None):
+    """One line per segment of ``by`` with its row count and the mean of each column."""
+    return segment_lines_from_partial(segment_partial(df, by, columns, count_column), columns)
+
+
+class PromptBuilder:
+    """Assembles a prompt from titled sections under a token budget.
+
+    Required sections are always included. Optional sections take turns adding
+    their next line, in the order they were added, and a section stops once its
+    next line would exceed the budget; lines should be listed most important first.
+    """
+
+    def __init__(self, token_budget=DEFAULT_TOKEN_BUDGET):
+        self.token_budget = token_budget
+        self.sections = []
+
+    def add(self, title, lines, required=False):
+        if isinstance(lines, str):
+            lines = [lines]
+        # The same row can come out of several digests (e.g. lowest margin and highest defect rate)
+        self.sections.append((title, list(dict.fromkeys(lines)), required))
+        return self
+
+    def build(self):
+        used = sum(estimate_tokens(self._render(title, lines)) for title, lines, required in self.sections if required)
+        kept = {position: lines for position, (_, lines, required) in enumerate(self.sections) if required}
+        optional = [position for position, (_, _, required) in enumerate(self.sections) if not required]
+        # Sections take turns by line rank, so each one gets its best line before any gets a second
+        full = set()
+        for rank in range(max((len(self.sections[p][1]) for p in optional), default=0)):
+            for position in optional:
+                title, lines, _ = self.sections[position]
+                if position in full or rank >= len(lines):
+                    continue
+                cost = estimate_tokens(lines[rank] + "\n")
+                if position not in kept and title:
+                    cost += estimate_tokens(title + "\n\n")
+                if used + cost > self.token_budget:
+                    full.add(position)
+                    continue
+                kept.setdefault(position, []).append(lines[rank])
+                used += cost
+        return "\n\n".join(
+            self._render(self.sections[position][0], kept[position]) for position in sorted(kept)
+        ) + "\n"
+
+    @staticmethod
+    def _render(title, lines):
+        body = "\n".join(lines)
+        return f"{title}\n{body}" if title else body
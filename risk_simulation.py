@@ -0,0 +1,259 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import data_access
+from scenario_planning import unit_revenue
+
+# === Monte Carlo Configuration ===
+RISK_COLUMNS = [
+    'Product type', 'Number of products sold', 'Revenue generated',
+    'Lead times', 'Manufacturing lead time', 'Shipping costs',
+]
+CHUNK_TRIALS = 50_000        # trials simulated per task; bounds per-worker memory
+HISTOGRAM_BINS = 20_000      # fixed bins let percentiles be merged across chunks
+DEMAND_VOLATILITY = 0.25     # scales each product type's dispersion in units sold into a demand shock sigma
+LEAD_TIME_HORIZON_DAYS = 30  # days away from the median at which the lead-time effect saturates
+LEAD_TIME_SENSITIVITY = 0.5  # share of sales exposed to lead-time swings
+TAIL_SIGMAS = 6              # samples are clipped to this many sigmas so they always land in the histogram
+MAX_WORKERS = int(os.environ.get('RISK_SIM_WORKERS', os.cpu_count() or 1))
+
+
+def risk_partial(batch):
+    """Per-product-type sums, moments and lead-time value counts; merged with data_access.merge_partials."""
+    codes, groups = pd.factorize(batch['Product type'])
+    rows = codes >= 0
+    codes = codes[rows]
+    lead_times = (batch['Lead times'] + batch['Manufacturing lead time']).to_numpy(dtype='float64')[rows]
+    shipping = batch['Shipping costs'].to_numpy(dtype='float64')[rows]
+    sold = batch['Number of products sold'].to_numpy(dtype='float64')[rows]
+    # Blank cells (NaN) are left out of each fit rather than poisoning it
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_costs = np.where(shipping > 0, np.log(shipping), np.nan)
+
+    def by_group(values):
+        return np.bincount(codes, weights=values, minlength=len(groups))
+
+    sums = {
+        'revenue': by_group(unit_revenue(batch)[rows]),
+        'shipping_total': by_group(np.nan_to_num(shipping)),
+        'sold_count': by_group(~np.isnan(sold)),
+        'sold_sum': by_group(np.nan_to_num(sold)),
+        'sold_sum_sq': by_group(np.nan_to_num(sold) ** 2),
+        'log_cost_count': by_group(~np.isnan(log_costs)),
+        'log_cost_sum': by_group(np.nan_to_num(log_costs)),
+        'log_cost_sum_sq': by_group(np.nan_to_num(log_costs) ** 2),
+    }
+    partial = {}
+    for g, group in enumerate(groups):
+        partial[group] = {name: float(values[g]) for name, values in sums.items()}
+        # Lead times are whole days, so their value counts stay small however long the history
+        values, counts = np.unique(lead_times[(codes == g) & ~np.isnan(lead_times)], return_counts=True)
+        partial[group]['lead_times'] = {float(value): int(count) for value, count in zip(values, counts)}
+    return partial
+
+
+def _moments(count, total, total_sq):
+    # (mean, population std) from running sums; (0, 0) for an empty group
+    if not count:
+        return 0.0, 0.0
+    mean = total / count
+    return mean, np.sqrt(max(total_sq / count - mean ** 2, 0.0))
+
+
+def _weighted_median(values, weights):
+    # Same as np.median over the values repeated by their weights (values sorted ascending)
+    cumulative = np.cumsum(weights)
+    n = cumulative[-1]
+    lower = values[np.searchsorted(cumulative, (n + 1) // 2)]
+    upper = values[np.searchsorted(cumulative, n // 2 + 1)]
+    return (lower + upper) / 2
+
+
+def risk_model_from_totals(totals, demand_change=0.0):
+    """Fit per-product-type distributions from ``risk_partial`` totals.
+
+    Demand shocks are normal around ``demand_change`` with sigma from the spread of
+    units sold, total lead time (supplier + manufacturing) is resampled from the
+    observed values, and shipping costs follow a lognormal fitted to the observed costs.
+    Late deliveries lose sales and early ones win them back, centred so that
+    historical lead times have no net effect: history already reflects them.
+    """
+    groups = sorted(totals)
+    model = {
+        'groups': groups,
+        'demand_mean': demand_change / 100,
+        'revenue': np.zeros(len(groups)),
+        'shipping_total': np.zeros(len(groups)),
+        'demand_sigma': np.zeros(len(groups)),
+        'lead_time_median': np.zeros(len(groups)),
+        'lead_time_values': [],
+        'lead_time_weights': [],
+        'lateness_offset': np.zeros(len(groups)),
+        'shipping_log_mean': np.zeros(len(groups)),
+        'shipping_log_sigma': np.zeros(len(groups)),
+    }
+    for g, group in enumerate(groups):
+        stats = totals[group]
+        model['revenue'][g] = stats['revenue']
+        model['shipping_total'][g] = stats['shipping_total']
+        sold_mean, sold_std = _moments(stats['sold_count'], stats['sold_sum'], stats['sold_sum_sq'])
+        model['demand_sigma'][g] = DEMAND_VOLATILITY * sold_std / sold_mean if sold_mean > 0 else 0.0
+        lead_times = stats['lead_times'] or {0.0: 1}
+        values = np.array(sorted(lead_times), dtype='float64')
+        counts = np.array([lead_times[value] for value in values], dtype='float64')
+        model['lead_time_median'][g] = _weighted_median(values, counts)
+        model['lead_time_values'].append(values)
+        model['lead_time_weights'].append(counts / counts.sum())
+        model['lateness_offset'][g] = (_lateness(values, model['lead_time_median'][g]) * counts).sum() / counts.sum()
+        model['shipping_log_mean'][g], model['shipping_log_sigma'][g] = _moments(
+            stats['log_cost_count'], stats['log_cost_sum'], stats['log_cost_sum_sq']
+        )
+
+    # Shipping totals are scaled by (sampled cost / mean cost) so the base case keeps observed spend
+    model['shipping_mean'] = np.exp(model['shipping_log_mean'] + model['shipping_log_sigma'] ** 2 / 2)
+    max_demand = 1 + model['demand_mean'] + TAIL_SIGMAS * model['demand_sigma']
+    max_shipping = np.exp(model['shipping_log_mean'] + TAIL_SIGMAS * model['shipping_log_sigma']) / model['shipping_mean']
+    # Early deliveries lift sales above history, so the best lead-time factor can exceed 1
+    min_lateness = np.array([
+        _lateness(values[0], median) for values, median in zip(model['lead_time_values'], model['lead_time_median'])
+    ])
+    max_lead_factor = 1 - LEAD_TIME_SENSITIVITY * (min_lateness - model['lateness_offset'])
+    model['histogram_range'] = (
+        -float((model['shipping_total'] * max_shipping).sum()),
+        float((model['revenue'] * np.maximum(max_demand, 0) * max_lead_factor).sum()),
+    )
+    # Same net-of-shipping basis as the simulated outcomes: the expected outcome at no demand change
+    model['base_revenue'] = float(model['revenue'].sum() - model['shipping_total'].sum())
+    return model
+
+
+def fit_risk_model(df, demand_change=0.0):
+    return risk_model_from_totals(risk_partial(df), demand_change)
+
+
+def stream_risk_model(demand_change=0.0, path=None, batch_rows=data_access.STREAM_BATCH_ROWS):
+    """fit_risk_model over the history in fixed-size batches, for data larger than memory."""
+    totals = None
+    for batch in data_access.iter_batches(RISK_COLUMNS, path, batch_rows):
+        totals = data_access.merge_partials(totals, risk_partial(batch))
+    return risk_model_from_totals(totals, demand_change)
+
+
+def _lateness(lead_times, median):
+    # -1 (very early) .. 1 (very late) relative to the product type's median lead time
+    return np.clip((lead_times - median) / LEAD_TIME_HORIZON_DAYS, -1, 1)
+
+
+def _simulate_chunk(model, seed_sequence, n_trials):
+    # Runs in a worker process: simulate n_trials and return only mergeable aggregates
+    rng = np.random.default_rng(seed_sequence)
+    n_groups = len(model['groups'])
+    z = np.clip(rng.standard_normal((n_trials, n_groups)), -TAIL_SIGMAS, TAIL_SIGMAS)
+    demand = np.maximum(1 + model['demand_mean'] + z * model['demand_sigma'], 0)
+
+    lead_times = np.column_stack([
+        rng.choice(values, n_trials, p=weights) for values, weights in zip(model['lead_time_values'], model['lead_time_weights'])
+    ])
+    lost_share = LEAD_TIME_SENSITIVITY * (_lateness(lead_times, model['lead_time_median']) - model['lateness_offset'])
+
+    z = np.clip(rng.standard_normal((n_trials, n_groups)), -TAIL_SIGMAS, TAIL_SIGMAS)
+    shipping = np.exp(model['shipping_log_mean'] + z * model['shipping_log_sigma']) / model['shipping_mean']
+
+    revenue = (demand * (1 - lost_share)) @ model['revenue'] - shipping @ model['shipping_total']
+    counts, _ = np.histogram(revenue, bins=HISTOGRAM_BINS, range=model['histogram_range'])
+    return {
+        'trials': n_trials,
+        'sum': float(revenue.sum()),
+        'sum_sq': float(np.square(revenue).sum()),
+        'min': float(revenue.min()),
+        'max': float(revenue.max()),
+        'below_base': int((revenue < model['base_revenue']).sum()),
+        'counts': counts,
+    }
+
+
+def _merge(total, part):
+    if total is None:
+        return part
+    return {
+        'trials': total['trials'] + part['trials'],
+        'sum': total['sum'] + part['sum'],
+        'sum_sq': total['sum_sq'] + part['sum_sq'],
+        'min': min(total['min'], part['min']),
+        'max': max(total['max'], part['max']),
+        'below_base': total['below_base'] + part['below_base'],
+        'counts': total['counts'] + part['counts'],
+    }
+
+
+def _percentile(counts, edges, q):
+    cumulative = np.cumsum(counts)
+    position = int(np.searchsorted(cumulative, q * cumulative[-1]))
+    return float((edges[position] + edges[position + 1]) / 2)
+
+
+def run_monte_carlo(n_trials=100_000, demand_change=0.0, seed=42, workers=None, df=None, plot_bins=60):
+    """Simulate ``n_trials`` revenue outcomes and return percentile / VaR statistics.
+
+    Trials are split into chunks with independent seeds spawned from ``seed``, so
+    results do not depend on the worker count. Chunks return histograms and sums
+    that are merged as they arrive, keeping memory fixed regardless of trial count.
+    """
+    if df is not None:
+        model = fit_risk_model(df, demand_change)
+    elif data_access.should_stream():
+        model = stream_risk_model(demand_change)
+    else:
+        model = fit_risk_model(data_access.load_supply_chain_data(columns=RISK_COLUMNS), demand_change)
+    sizes = [CHUNK_TRIALS] * (n_trials // CHUNK_TRIALS)
+    if n_trials % CHUNK_TRIALS:
+        sizes.append(n_trials % CHUNK_TRIALS)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+
+    workers = min(workers or MAX_WORKERS, len(sizes))
+    total = None
+    if workers <= 1:
+        for seed_sequence, size in zip(seeds, sizes):
+            total = _merge(total, _simulate_chunk(model, seed_sequence, size))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for part in executor.map(_simulate_chunk, [model] * len(sizes), seeds, sizes):
+                total = _merge(total, part)
+
+    edges = np.linspace(*model['histogram_range'], HISTOGRAM_BINS + 1)
+    counts = total['counts']
+    mean = total['sum'] / total['trials']
+    std = np.sqrt(max(total['sum_sq'] / total['trials'] - mean ** 2, 0.0))
+    p5 = _percentile(counts, edges, 0.05)
+    midpoints = (edges[:-1] + edges[1:]) / 2
+    tail = midpoints <= p5
+    tail_mean = float((midpoints[tail] * counts[tail]).sum() / max(counts[tail].sum(), 1))
+
+    # Coarser histogram over the occupied range for plotting
+    occupied = np.nonzero(counts)[0]
+    plot_counts, plot_edges = np.histogram(
+        midpoints[occupied[0]:occupied[-1] + 1], bins=plot_bins, weights=counts[occupied[0]:occupied[-1] + 1]
+    )
+
+    return {
+        'trials': total['trials'],
+        'demand_change': demand_change,
+        'seed': seed,
+        'base_revenue': model['base_revenue'],
+        'expected_revenue': mean,
+        'std_revenue': float(std),
+        'min_revenue': total['min'],
+        'max_revenue': total['max'],
+        'percentiles': {q: _percentile(counts, edges, q / 100) for q in (1, 5, 25, 50, 75, 95, 99)},
+        'var_95': mean - p5,
+        'cvar_95': mean - tail_mean,
+        'prob_below_base': total['below_base'] / total['trials'],
+        'histogram': {
+            'bin_start': plot_edges[:-1].tolist(),
+            'bin_end': plot_edges[1:].tolist(),
+            'count': plot_counts.astype(int).tolist(),
+        },
+    }
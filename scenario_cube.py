@@ -0,0 +1,132 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+import data_access
+from scenario_planning import SCENARIO_COLUMNS, scenario_label, scenario_partial, segment_partial
+
+# === Scenario Cube Configuration ===
+# Matches the dashboard's demand slider
+DEMAND_CHANGES = np.arange(-50, 51, 5)
+CUBE_DIMENSIONS = {
+    'Product type': 'Product type',
+    'Supplier': 'Supplier name',
+    'Location': 'Location',
+    'Carrier': 'Shipping carriers',
+}
+
+_cubes = {}
+_lock = threading.Lock()
+
+
+def cube_partial(batch, dimensions=CUBE_DIMENSIONS):
+    # Overall totals plus per-group sums for every dimension; merged with data_access.merge_partials
+    totals = scenario_partial(batch)
+    totals['dimensions'] = {name: segment_partial(batch, column) for name, column in dimensions.items()}
+    return totals
+
+
+def _mean(sums, counts):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.asarray(sums, dtype='float64') / np.asarray(counts, dtype='float64')
+
+
+class ScenarioCube:
+    """Scenario results for every slider value, overall and per group of each dimension.
+
+    Built from ``cube_partial`` totals, so a cube costs the same whether the history
+    is loaded whole or streamed in batches. Each dimension holds a (demand changes x
+    groups) matrix of simulated revenue plus per-group base revenue, lead time and
+    shipping cost, so lookups are array indexing instead of a pass over the data.
+    """
+
+    def __init__(self, totals, changes=DEMAND_CHANGES):
+        self.changes = np.asarray(changes)
+        self.base_revenue = float(totals['revenue'])
+        self.lead_time = float(_mean(totals['lead_time_sum'], totals['lead_time_count']))
+        self.shipping_cost = float(_mean(totals['shipping_sum'], totals['shipping_count']))
+        multipliers = 1 + self.changes.astype('float64') / 100
+        self.simulated_revenue = multipliers * totals['unit_revenue']
+
+        self.dimensions = {}
+        for name, segments in totals['dimensions'].items():
+            groups = sorted(segments)
+
+            def column(metric):
+                return np.array([segments[group][metric] for group in groups], dtype='float64')
+
+            self.dimensions[name] = {
+                'groups': groups,
+                'base_revenue': column('revenue'),
+                'simulated_revenue': np.outer(multipliers, column('unit_revenue')),
+                'lead_time': _mean(column('lead_time_sum'), column('lead_time_count')),
+                'shipping_cost': _mean(column('shipping_sum'), column('shipping_count')),
+            }
+
+    def _position(self, percentage_change):
+        position = int(np.searchsorted(self.changes, percentage_change))
+        if position >= len(self.changes) or self.changes[position] != percentage_change:
+            raise KeyError(f"{percentage_change}% is not a precomputed demand change")
+        return position
+
+    def structured_data(self, percentage_change, dimension=None, group=None):
+        """Same shape as ``get_scenario_structured_data``, optionally for one group of a dimension."""
+        position = self._position(percentage_change)
+        if dimension is None:
+            base, simulated = self.base_revenue, self.simulated_revenue[position]
+            lead_time, shipping_cost = self.lead_time, self.shipping_cost
+        else:
+            cube = self.dimensions[dimension]
+            g = cube['groups'].index(group)
+            base, simulated = cube['base_revenue'][g], cube['simulated_revenue'][position, g]
+            lead_time, shipping_cost = cube['lead_time'][g], cube['shipping_cost'][g]
+        return {
+            'demand_change': percentage_change,
+            'base_revenue': float(base),
+            'simulated_revenue': float(simulated),
+            'revenue_change_percent': float((simulated - base) / base * 100) if base else 0.0,
+            'lead_time': float(lead_time),
+            'shipping_cost': float(shipping_cost),
+            'scenario_label': scenario_label(percentage_change),
+        }
+
+    def breakdown(self, percentage_change, dimension):
+        # One row per group of the dimension at the given demand change
+        position = self._position(percentage_change)
+        cube = self.dimensions[dimension]
+        simulated = cube['simulated_revenue'][position]
+        return pd.DataFrame({
+            dimension: cube['groups'],
+            'base_revenue': cube['base_revenue'],
+            'simulated_revenue': simulated,
+            'revenue_change': simulated - cube['base_revenue'],
+            'lead_time': cube['lead_time'],
+            'shipping_cost': cube['shipping_cost'],
+        })
+
+    def sweep(self):
+        # Overall sensitivity curve across the precomputed demand changes
+        return pd.DataFrame({
+            'demand_change': self.changes,
+            'base_revenue': self.base_revenue,
+            'simulated_revenue': self.simulated_revenue,
+            'revenue_change_percent': (self.simulated_revenue - self.base_revenue) / self.base_revenue * 100,
+        })
+
+
+def get_scenario_cube(path=None):
+    """Return the scenario cube for the current data version, building it on first use."""
+    version = data_access.data_version(path)
+    with _lock:
+        cached = _cubes.get(path)
+        if cached is None or cached[0] != version:
+            columns = SCENARIO_COLUMNS + list(CUBE_DIMENSIONS.values())
+            if data_access.should_stream(path):
+                totals = None
+                for batch in data_access.iter_batches(columns, path):
+                    totals = data_access.merge_partials(totals, cube_partial(batch))
+            else:
+                totals = cube_partial(data_access.load_supply_chain_data(path, columns=columns))
+            cached = _cubes[path] = (version, ScenarioCube(totals))
+    return cached[1]
@@ -1,10 +1,21 @@
+import numpy as np
 import pandas as pd 
-import requests
+import data_access
+from llm_client import generate, generate_stream
+from instrumentation import annotate, span
+from prompt_builder import PromptBuilder
 
-data_path = "C:/Users/KATALA JEETHENDER/OneDrive/Desktop/college project modification/historical data/supply_chain_data.csv" 
+# Only the columns the scenario model reads are loaded; data_access reads 'Lead time'
+# from 'Lead times' for histories that only have the latter
+SCENARIO_COLUMNS = ['Number of products sold', 'Revenue generated', 'Lead time', 'Shipping costs']
 
-def load_supply_chain_data():
-    return pd.read_csv(data_path)
+def load_supply_chain_data(extra_columns=()):
+    return data_access.load_supply_chain_data(columns=SCENARIO_COLUMNS + list(extra_columns))
+
+def scenario_label(percentage_change):
+    if percentage_change < 0:
+        return f"{abs(percentage_change)}% Demand Drop"
+    return f"{percentage_change}% Demand Increase"
 
 def simulate_demand_change(df, percentage_change):
     df = df.copy()
@@ -13,16 +24,109 @@ def simulate_demand_change(df, percentage_change):
     df['Simulated_Revenue'] = df['Simulated_Sales'] * df['Revenue_per_unit']
     return df
 
+def unit_revenue(df):
+    # sold * (revenue / sold) per row; rows without a defined per-unit revenue drop out, as in simulate_demand_change
+    sold = df['Number of products sold'].to_numpy(dtype='float64')
+    revenue = df['Revenue generated'].to_numpy(dtype='float64')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        per_row = sold * (revenue / sold)
+    return np.where(np.isfinite(per_row), per_row, 0.0)
+
+def simulate_demand_sweep(df, changes, by=None):
+    """Simulated revenue for many demand scenarios in one pass, without copying ``df``.
+
+    With ``by=None``, ``changes`` is a 1-D sequence of uniform % changes. With ``by``
+    set to a column, ``changes`` is either a ``{group: [% per scenario]}`` mapping or
+    a 2-D array of shape (scenarios, groups) in sorted group order. Mapping values
+    may be scalars (broadcast to every scenario); groups left out of a mapping keep
+    their base demand and unknown groups raise ``ValueError``. Returns one row per scenario.
+    """
+    row_revenue = unit_revenue(df)
+    original_revenue = float(np.nansum(df['Revenue generated'].to_numpy(dtype='float64')))
+
+    if by is None:
+        changes = np.asarray(changes, dtype='float64').reshape(-1, 1)
+        group_revenue = np.array([row_revenue.sum()])
+        result = pd.DataFrame({'demand_change': changes[:, 0]})
+    else:
+        codes, groups = pd.factorize(df[by], sort=True)
+        group_revenue = np.bincount(codes[codes >= 0], weights=row_revenue[codes >= 0], minlength=len(groups))
+        if isinstance(changes, dict):
+            unknown = set(changes) - set(groups)
+            if unknown:
+                raise ValueError(f"No {by!r} rows for {sorted(map(str, unknown))}; expected some of {list(groups)}")
+            # A scalar is one scenario; sequences must agree on the number of scenarios
+            columns = {group: np.atleast_1d(np.asarray(values, dtype='float64')) for group, values in changes.items()}
+            n_scenarios = max((len(values) for values in columns.values()), default=1)
+            if any(len(values) not in (1, n_scenarios) for values in columns.values()):
+                raise ValueError(f"Every group needs 1 or {n_scenarios} changes, got {changes!r}")
+            matrix = np.zeros((n_scenarios, len(groups)))
+            for position, group in enumerate(groups):
+                if group in columns:
+                    matrix[:, position] = np.broadcast_to(columns[group], n_scenarios)
+            changes = matrix
+        changes = np.asarray(changes, dtype='float64').reshape(-1, len(groups))
+        result = pd.DataFrame(changes, columns=[f"{group} change %" for group in groups])
+
+    # (scenarios x groups) multipliers times per-group revenue -> one simulated total per scenario
+    simulated = (1 + changes / 100) @ group_revenue
+    result['base_revenue'] = original_revenue
+    result['simulated_revenue'] = simulated
+    result['revenue_change_percent'] = (simulated - original_revenue) / original_revenue * 100
+    return result
+
+def get_scenario_sweep(changes=range(-50, 51), by=None):
+    df = load_supply_chain_data([by] if by else [])
+    return simulate_demand_sweep(df, changes, by)
+
+def scenario_data_from_totals(totals, percentage_change):
+    # Shared by the in-memory and streaming paths so both report identical numbers
+    original_revenue = totals['revenue']
+    simulated_revenue = (1 + percentage_change / 100) * totals['unit_revenue']
+    return {
+        'demand_change': percentage_change,
+        'base_revenue': float(original_revenue),
+        'simulated_revenue': float(simulated_revenue),
+        'revenue_change_percent': float((simulated_revenue - original_revenue) / original_revenue * 100),
+        'lead_time': totals['lead_time_sum'] / totals['lead_time_count'],
+        'shipping_cost': totals['shipping_sum'] / totals['shipping_count'],
+        'scenario_label': scenario_label(percentage_change)
+    }
+
+def scenario_partial(batch):
+    return {
+        'rows': len(batch),
+        'revenue': float(np.nansum(batch['Revenue generated'].to_numpy(dtype='float64'))),
+        'unit_revenue': float(unit_revenue(batch).sum()),
+        'lead_time_sum': float(batch['Lead time'].sum()),
+        'lead_time_count': int(batch['Lead time'].count()),
+        'shipping_sum': float(batch['Shipping costs'].sum()),
+        'shipping_count': int(batch['Shipping costs'].count()),
+    }
+
+def stream_scenario_structured_data(percentage_change: float, path=None, batch_rows=data_access.STREAM_BATCH_ROWS):
+    """get_scenario_structured_data over the history in fixed-size batches, for data larger than memory."""
+    totals = None
+    with span('scenario.stream', batch_rows=batch_rows):
+        for batch in data_access.iter_batches(SCENARIO_COLUMNS, path, batch_rows):
+            totals = data_access.merge_partials(totals, scenario_partial(batch))
+        annotate(rows=totals['rows'])
+    return scenario_data_from_totals(totals, percentage_change)
+
 def get_scenario_structured_data(percentage_change: float):
-    df = load_supply_chain_data()
-    scenario_df = simulate_demand_change(df, percentage_change)
+    if data_access.should_stream():
+        return stream_scenario_structured_data(percentage_change)
+    with span('scenario.load'):
+        df = load_supply_chain_data()
+        annotate(rows=len(df))
+    with span('scenario.sweep'):
+        sweep = simulate_demand_sweep(df, [percentage_change]).iloc[0]
     
-    original_revenue = df['Revenue generated'].sum()
-    simulated_revenue = scenario_df['Simulated_Revenue'].sum()
-    revenue_change = ((simulated_revenue - original_revenue) / original_revenue) * 100
+    original_revenue = sweep['base_revenue']
+    simulated_revenue = sweep['simulated_revenue']
+    revenue_change = sweep['revenue_change_percent']
     
-    lead_time_col = 'Lead time' if 'Lead time' in df.columns else 'Lead times'
-    avg_lead_time = float(df[lead_time_col].mean())
+    avg_lead_time = float(df['Lead time'].mean())
     avg_shipping = float(df['Shipping costs'].mean())
     
     return {
@@ -32,65 +136,110 @@ def get_scenario_structured_data(percentage_change: float):
         'revenue_change_percent': float(revenue_change),
         'lead_time': avg_lead_time,
         'shipping_cost': avg_shipping,
-        'scenario_label': f"{abs(percentage_change)}% Demand Drop" if percentage_change < 0 else f"{percentage_change}% Demand Increase"
+        'scenario_label': scenario_label(percentage_change)
     }
 
-def generate_prompt_from_data(scenario_name, df, percentage_change):
-    if 'Simulated_Revenue' in df.columns:
-        total_revenue = df['Simulated_Revenue'].sum()
-        original_revenue = df['Revenue generated'].sum()
-        revenue_change = ((total_revenue - original_revenue) / original_revenue) * 100
-    else:
-        total_revenue = df['Revenue generated'].sum()
-        revenue_change = 0
-    
-    lead_time_col = 'Lead time' if 'Lead time' in df.columns else 'Lead times'
-    avg_lead_time = df[lead_time_col].mean()
-    avg_shipping = df['Shipping costs'].mean()
+SCENARIO_PROMPT_TOKEN_BUDGET = 350
+# Segment breakdowns offered to the LLM, most useful first; the budget trims the rest
+SCENARIO_SEGMENTS = ['Product type', 'Shipping carriers', 'Location']
+
+def segment_partial(df, column):
+    # Per-segment sums from one bincount each, mergeable across batches like scenario_partial;
+    # rows without a segment are left out, as in a groupby
+    codes, segments = pd.factorize(df[column])
+    rows = codes >= 0
+    codes = codes[rows]
 
-    prompt = f"""
-You are a supply chain analyst. The following scenario has been simulated: "{scenario_name}"
+    def by_segment(values):
+        return np.bincount(codes, weights=values[rows], minlength=len(segments))
 
-📊 Numerical Summary:
-- Total Revenue: ${total_revenue:,.2f}
-- Revenue Change: {revenue_change:+.1f}%
-- Avg Lead Time: {avg_lead_time:.2f} days
-- Avg Shipping Cost: ${avg_shipping:.2f}
+    lead_time = df['Lead time'].to_numpy(dtype='float64')
+    shipping = df['Shipping costs'].to_numpy(dtype='float64')
+    sums = {
+        'revenue': by_segment(np.nan_to_num(df['Revenue generated'].to_numpy(dtype='float64'))),
+        'unit_revenue': by_segment(unit_revenue(df)),
+        'lead_time_sum': by_segment(np.nan_to_num(lead_time)),
+        'lead_time_count': by_segment(~np.isnan(lead_time)),
+        'shipping_sum': by_segment(np.nan_to_num(shipping)),
+        'shipping_count': by_segment(~np.isnan(shipping)),
+    }
+    return {str(segment): {name: float(values[g]) for name, values in sums.items()} for g, segment in enumerate(segments)}
 
-Please analyze:
-1. What is the likely business impact of this scenario?
-2. What actionable steps should a supply chain manager take?
-3. Are there any risks or opportunities this scenario uncovers?
+def segment_digest_from_totals(segments, percentage_change):
+    # One line per segment, largest revenue first
+    total = sum(segment['revenue'] for segment in segments.values())
+    lines = []
+    for name, segment in sorted(segments.items(), key=lambda item: -item[1]['revenue']):
+        lead_time = segment['lead_time_sum'] / segment['lead_time_count'] if segment['lead_time_count'] else float('nan')
+        lines.append(
+            f"- {name}: ${segment['revenue']:,.0f} -> ${(1 + percentage_change / 100) * segment['unit_revenue']:,.0f} "
+            f"({segment['revenue'] / total:.0%} of revenue), avg lead time {lead_time:.1f} days"
+        )
+    return lines
 
-Respond with practical, business-savvy suggestions.
-"""
-    return prompt
+def segment_digest(df, column, percentage_change):
+    return segment_digest_from_totals(segment_partial(df, column), percentage_change)
 
+def summary_partial(batch):
+    # Scenario totals plus every segment breakdown the prompt offers
+    totals = scenario_partial(batch)
+    totals['segments'] = {column: segment_partial(batch, column) for column in SCENARIO_SEGMENTS if column in batch.columns}
+    return totals
+
+def prompt_from_totals(scenario_name, totals, percentage_change, token_budget=SCENARIO_PROMPT_TOKEN_BUDGET):
+    scenario = scenario_data_from_totals(totals, percentage_change)
+
+    builder = PromptBuilder(token_budget)
+    builder.add("", f'You are a supply chain analyst. The following scenario has been simulated: "{scenario_name}"', required=True)
+    builder.add("📊 Numerical Summary:", [
+        f"- Total Revenue: ${scenario['simulated_revenue']:,.2f}",
+        f"- Revenue Change: {scenario['revenue_change_percent']:+.1f}%",
+        f"- Avg Lead Time: {scenario['lead_time']:.2f} days",
+        f"- Avg Shipping Cost: ${scenario['shipping_cost']:.2f}",
+    ], required=True)
+    for column in SCENARIO_SEGMENTS:
+        if column in totals.get('segments', {}):
+            builder.add(f"🧩 By {column} (base -> simulated revenue):",
+                        segment_digest_from_totals(totals['segments'][column], percentage_change))
+    builder.add("Please analyze:", [
+        "1. What is the likely business impact of this scenario?",
+        "2. What actionable steps should a supply chain manager take?",
+        "3. Are there any risks or opportunities this scenario uncovers?",
+    ], required=True)
+    builder.add("", "Respond with practical, business-savvy suggestions.", required=True)
+    return builder.build()
+
+def generate_prompt_from_data(scenario_name, df, percentage_change, token_budget=SCENARIO_PROMPT_TOKEN_BUDGET):
+    # Totals come from one vectorized pass over the base data; no simulated copy is needed
+    return prompt_from_totals(scenario_name, summary_partial(df), percentage_change, token_budget)
+
+def stream_scenario_prompt(percentage_change, path=None, batch_rows=data_access.STREAM_BATCH_ROWS):
+    """generate_prompt_from_data over the history in fixed-size batches, for data larger than memory."""
+    totals = None
+    with span('scenario.stream', batch_rows=batch_rows):
+        for batch in data_access.iter_batches(SCENARIO_COLUMNS + SCENARIO_SEGMENTS, path, batch_rows):
+            totals = data_access.merge_partials(totals, summary_partial(batch))
+        annotate(rows=totals['rows'])
+    return prompt_from_totals(scenario_label(percentage_change), totals, percentage_change)
+
+# LLM errors propagate so the narrative phase can mark the section as failed
 def get_llm_insight(prompt):
-    try:
-        response = requests.post(
-            'http://localhost:11434/api/generate',
-            json={
-                "model": "tinyllama",
-                "prompt": prompt,
-                "stream": False
-            },
-            timeout=30
-        )
-        return response.json()['response'].strip()
-    except Exception as e:
-        return f"Error getting LLM insight: {str(e)}"
+    return generate(prompt)
 
-def get_scenario_summary(percentage_change: float):
-    df = load_supply_chain_data()
-    scenario_df = simulate_demand_change(df, percentage_change)
+def stream_llm_insight(prompt):
+    return generate_stream(prompt)
 
-    if percentage_change < 0:
-        label = f"{abs(percentage_change)}% Demand Drop"
+def get_scenario_summary(percentage_change: float, stream: bool = False):
+    if data_access.should_stream():
+        prompt = stream_scenario_prompt(percentage_change)
     else:
-        label = f"{percentage_change}% Demand Increase"
+        with span('scenario.load'):
+            df = load_supply_chain_data(SCENARIO_SEGMENTS)
 
-    prompt = generate_prompt_from_data(label, scenario_df, percentage_change)
+        with span('scenario.prompt'):
+            prompt = generate_prompt_from_data(scenario_label(percentage_change), df, percentage_change)
+    if stream:
+        return stream_llm_insight(prompt)
     insight = get_llm_insight(prompt)
     return insight
 
@@ -1,32 +1,173 @@
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
 import pandas as pd
-import requests
+import data_access
+from llm_client import generate, generate_stream
+from llm_batch import generate_batch
+from instrumentation import span
+from prompt_builder import PromptBuilder, extreme_rows, format_row, segment_lines_from_partial, segment_partial
 
-# Load Data
-data_path = "C:/Users/KATALA JEETHENDER/OneDrive/Desktop/college project modification/historical data/supply_chain_data.csv"
-df = pd.read_csv(data_path)
+# Columns SKU rationalization reads; nothing is loaded until an analysis is requested
+SKU_COLUMNS = [
+    'SKU', 'Product type', 'Revenue generated', 'Manufacturing costs',
+    'Number of products sold', 'Stock levels', 'Defect rates',
+]
 
 # STEP 1: Compute Profit, Profit Margin, Sales Velocity
-df['Profit'] = df['Revenue generated'] - df['Manufacturing costs']
-df['Profit Margin'] = df['Profit'] / df['Revenue generated']
-df['Sales Velocity'] = df['Number of products sold'] / (df['Stock levels'] + 1)  # Avoid divide by zero
+def add_sku_metrics(data):
+    data = data.copy(deep=False)
+    data['Profit'] = data['Revenue generated'] - data['Manufacturing costs']
+    data['Profit Margin'] = data['Profit'] / data['Revenue generated']
+    data['Sales Velocity'] = data['Number of products sold'] / (data['Stock levels'] + 1)  # Avoid divide by zero
+    return data
 
 # STEP 2: Define Rules for Rationalization
-def classify_sku(row):
+# Margin is a fraction of revenue, velocity is units sold per unit of stock, defect rate is in %
+SKU_THRESHOLDS = {
+    'keep_min_margin': 0.25,
+    'keep_min_velocity': 1.0,
+    'keep_max_defect': 1.5,
+    'optimize_min_margin': 0.1,
+    'optimize_min_velocity': 0.5,
+    'optimize_max_defect': 3.5,
+}
+SKU_LABELS = ['✅ Keep', '♻️ Bundle/Optimize', '❌ Discontinue']
+
+def classify_sku(row, thresholds=SKU_THRESHOLDS):
+    # Row-at-a-time reference implementation of the rules in classify_skus
+    t = thresholds
     margin = row['Profit Margin']
     velocity = row['Sales Velocity']
     defect = row['Defect rates']
     
-    if margin >= 0.25 and velocity >= 1.0 and defect < 1.5:
+    if margin >= t['keep_min_margin'] and velocity >= t['keep_min_velocity'] and defect < t['keep_max_defect']:
         return '✅ Keep'
-    elif 0.1 <= margin < 0.25 or 0.5 <= velocity < 1.0 or 1.5 <= defect < 3.5:
+    elif (t['optimize_min_margin'] <= margin < t['keep_min_margin']
+          or t['optimize_min_velocity'] <= velocity < t['keep_min_velocity']
+          or t['keep_max_defect'] <= defect < t['optimize_max_defect']):
         return '♻️ Bundle/Optimize'
     else:
         return '❌ Discontinue'
 
-df['SKU Recommendation'] = df.apply(classify_sku, axis=1)
+def classify_skus(data, thresholds=None):
+    """Vectorized classify_sku over a whole frame; returns a categorical of SKU_LABELS.
+
+    NaN metrics fail every comparison, exactly as in the row-wise rules.
+    """
+    t = {**SKU_THRESHOLDS, **(thresholds or {})}
+    margin = data['Profit Margin'].to_numpy(dtype='float64')
+    velocity = data['Sales Velocity'].to_numpy(dtype='float64')
+    defect = data['Defect rates'].to_numpy(dtype='float64')
+
+    keep = (margin >= t['keep_min_margin']) & (velocity >= t['keep_min_velocity']) & (defect < t['keep_max_defect'])
+    optimize = (
+        ((margin >= t['optimize_min_margin']) & (margin < t['keep_min_margin']))
+        | ((velocity >= t['optimize_min_velocity']) & (velocity < t['keep_min_velocity']))
+        | ((defect >= t['keep_max_defect']) & (defect < t['optimize_max_defect']))
+    )
+    codes = np.select([keep, optimize], [0, 1], default=2).astype('int8')
+    return pd.Categorical.from_codes(codes, categories=SKU_LABELS)
+
+def classify_batch(data, thresholds=None):
+    # STEP 1 + STEP 2 on one frame: metrics plus 'SKU Recommendation'
+    analyzed = add_sku_metrics(data)
+    analyzed['SKU Recommendation'] = classify_skus(analyzed, thresholds)
+    return analyzed
+
+# === On-demand analysis, memoized per data version and thresholds ===
+class SkuAnalyzer:
+    """Classifies SKUs on request and keeps recent results keyed on data version + thresholds."""
+
+    def __init__(self, thresholds=None, max_results=8):
+        self.thresholds = {**SKU_THRESHOLDS, **(thresholds or {})}
+        self.max_results = max_results
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+
+    def analyze(self, data=None, data_version=None, thresholds=None):
+        """Return a shallow copy of the frame with metrics and 'SKU Recommendation' added.
+
+        Without ``data`` the shared dataset is loaded; a passed-in frame is keyed
+        on ``data_version`` if given, otherwise on a hash of its contents.
+        """
+        thresholds = {**self.thresholds, **(thresholds or {})}
+        if data is None:
+            data_version = 'default-' + data_access.data_version()
+        elif data_version is None:
+            data_version = 'hash-' + str(pd.util.hash_pandas_object(data, index=False).sum())
+        key = (data_version, tuple(sorted(thresholds.items())))
+
+        with self._lock:
+            if key in self._results:
+                self._results.move_to_end(key)
+                return self._results[key].copy(deep=False)
+
+        if data is None:
+            with span('sku.load'):
+                data = data_access.load_supply_chain_data(columns=SKU_COLUMNS)
+        with span('sku.classify', rows=len(data)):
+            analyzed = classify_batch(data, thresholds)
+
+        with self._lock:
+            self._results[key] = analyzed
+            while len(self._results) > self.max_results:
+                self._results.popitem(last=False)
+        return analyzed.copy(deep=False)
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+
+default_analyzer = SkuAnalyzer()
+
+# === Out-of-core path: mergeable partial aggregates per batch ===
+SKU_MEAN_COLUMNS = ['Profit Margin', 'Sales Velocity', 'Defect rates']
+
+def sku_totals(analyzed):
+    # Mergeable aggregates of an already classified frame, including the prompt's per-segment lines
+    recommendations = analyzed['SKU Recommendation'].value_counts()
+    return {
+        'rows': len(analyzed),
+        'recommendations': {label: int(recommendations.get(label, 0)) for label in SKU_LABELS},
+        'product_types': {str(k): int(v) for k, v in analyzed['Product type'].value_counts().items()},
+        'sums': {column: float(analyzed[column].sum()) for column in SKU_MEAN_COLUMNS},
+        'counts': {column: int(analyzed[column].count()) for column in SKU_MEAN_COLUMNS},
+        'segments': segment_partial(analyzed, 'Product type', SKU_MEAN_COLUMNS, 'SKU Recommendation'),
+    }
+
+def sku_partial(batch, thresholds=None):
+    return sku_totals(classify_batch(batch, thresholds))
+
+def sku_data_from_partial(totals):
+    product_types = sorted(totals['product_types'].items(), key=lambda item: item[1], reverse=True)
+    means = {column: totals['sums'][column] / totals['counts'][column] for column in SKU_MEAN_COLUMNS}
+    return {
+        'keep_count': totals['recommendations']['✅ Keep'],
+        'optimize_count': totals['recommendations']['♻️ Bundle/Optimize'],
+        'discontinue_count': totals['recommendations']['❌ Discontinue'],
+        'total_skus': totals['rows'],
+        'product_types': dict(product_types),
+        'avg_profit_margin': means['Profit Margin'],
+        'avg_sales_velocity': means['Sales Velocity'],
+        'avg_defect_rate': means['Defect rates']
+    }
+
+def stream_sku_structured_data(thresholds=None, path=None, batch_rows=data_access.STREAM_BATCH_ROWS):
+    """get_sku_structured_data over the history in fixed-size batches, for data larger than memory."""
+    totals = None
+    with span('sku.stream', batch_rows=batch_rows):
+        for batch in data_access.iter_batches(SKU_COLUMNS, path, batch_rows):
+            totals = data_access.merge_partials(totals, sku_partial(batch, thresholds))
+    return sku_data_from_partial(totals)
 
 # STEP 3: Generate structured data for dashboard
-def get_sku_structured_data():
+def get_sku_structured_data(data=None, thresholds=None):
+    if data is None and data_access.should_stream():
+        return stream_sku_structured_data(thresholds)
+    df = default_analyzer.analyze(data, thresholds=thresholds)
     keep_count = len(df[df['SKU Recommendation'] == '✅ Keep'])
     optimize_count = len(df[df['SKU Recommendation'] == '♻️ Bundle/Optimize'])
     discontinue_count = len(df[df['SKU Recommendation'] == '❌ Discontinue'])
@@ -43,47 +184,178 @@ def get_sku_structured_data():
     }
 
 # STEP 4: Generate Prompt for LLM
-def generate_rationalization_prompt(df):
-    top_discontinue = df[df['SKU Recommendation'] == '❌ Discontinue'].head(3)
-    top_bundle = df[df['SKU Recommendation'] == '♻️ Bundle/Optimize'].head(3)
-    top_keep = df[df['SKU Recommendation'] == '✅ Keep'].head(3)
-    prompt = f"""
-You are a supply chain strategy expert. Analyze the following SKU performance data and provide specific actionable insights.
+SKU_PROMPT_TOKEN_BUDGET = 450
+SKU_METRIC_COLUMNS = ['Profit Margin', 'Sales Velocity', 'Defect rates']
+SKU_DIGEST_ROWS = 3
+# (class, column, largest) for each representative-SKU list in the prompt
+SKU_DIGESTS = [
+    ('❌ Discontinue', 'Profit Margin', False), ('❌ Discontinue', 'Defect rates', True),
+    ('♻️ Bundle/Optimize', 'Sales Velocity', False), ('♻️ Bundle/Optimize', 'Profit Margin', False),
+    ('✅ Keep', 'Profit Margin', True), ('✅ Keep', 'Sales Velocity', True),
+]
+
+def _extremes(df, column, largest, n=SKU_DIGEST_ROWS):
+    return [format_row(df.iloc[i], 'SKU', SKU_METRIC_COLUMNS) for i in extreme_rows(df, column, n, largest)]
+
+def digest_rows(df):
+    """Rows of a classified frame that any SKU_DIGESTS list picks, in their original order.
 
-📉 Discontinue Candidates:
-{top_discontinue[['SKU', 'Profit Margin', 'Sales Velocity', 'Defect rates']].to_string(index=False)}
+    Every list comes out the same from this subset as from the whole frame, so
+    per-batch digests can be concatenated and digested again.
+    """
+    positions = set()
+    for label, column, largest in SKU_DIGESTS:
+        members = np.flatnonzero(df['SKU Recommendation'] == label)
+        positions.update(members[extreme_rows(df.iloc[members], column, SKU_DIGEST_ROWS, largest)])
+    return df.iloc[sorted(positions)]
 
-♻️ Bundle/Optimize Candidates:
-{top_bundle[['SKU', 'Profit Margin', 'Sales Velocity', 'Defect rates']].to_string(index=False)}
+def rationalization_prompt(totals, digest, token_budget=SKU_PROMPT_TOKEN_BUDGET):
+    """Digest of the classified catalog for the LLM: representative SKUs per class and per-segment summaries.
 
-📈 High-Performing SKUs:
-{top_keep[['SKU', 'Profit Margin', 'Sales Velocity', 'Defect rates']].to_string(index=False)}
+    ``totals`` come from ``sku_totals`` and ``digest`` from ``digest_rows``. Sections are
+    listed in priority order and trimmed line by line to ``token_budget``.
+    """
+    counts = totals['recommendations']
+    builder = PromptBuilder(token_budget)
+    builder.add("", "You are a supply chain strategy expert. Analyze the following SKU performance data and provide specific actionable insights.", required=True)
+    builder.add("📊 Portfolio:", [
+        f"- {totals['rows']} SKUs: " + ", ".join(f"{label} {counts[label]}" for label in SKU_LABELS),
+        "- " + ", ".join(f"avg {column} {totals['sums'][column] / totals['counts'][column]:.2f}" for column in SKU_METRIC_COLUMNS),
+    ], required=True)
+    titles = {
+        '❌ Discontinue': "📉 Discontinue Candidates (lowest margin, then highest defect rate):",
+        '♻️ Bundle/Optimize': "♻️ Bundle/Optimize Candidates (lowest sales velocity, then lowest margin):",
+        '✅ Keep': "📈 High-Performing SKUs (highest margin, then highest sales velocity):",
+    }
+    for label, title in titles.items():
+        members = digest[digest['SKU Recommendation'] == label]
+        builder.add(title, [
+            line for digest_label, column, largest in SKU_DIGESTS if digest_label == label
+            for line in _extremes(members, column, largest)
+        ])
+    builder.add("🧩 By Product Type:", segment_lines_from_partial(totals['segments'], SKU_METRIC_COLUMNS))
+    builder.add("Instructions:", [
+        "1. For each Discontinue candidate, explain why it is underperforming (using actual metrics).",
+        "2. For each Bundle/Optimize candidate, suggest what product(s) it could be bundled with or how it can be improved.",
+        "3. Highlight any patterns or risks visible from the data.",
+    ], required=True)
+    builder.add("Format:", [
+        "- List insights as bullet points per SKU.",
+        "- End with a summary paragraph on portfolio health.",
+    ], required=True)
+    return builder.build()
 
-Instructions:
-1. For each Discontinue candidate, explain why it is underperforming (using actual metrics).
-2. For each Bundle/Optimize candidate, suggest what product(s) it could be bundled with or how it can be improved.
-3. Highlight any patterns or risks visible from the data.
+def generate_rationalization_prompt(df, token_budget=SKU_PROMPT_TOKEN_BUDGET):
+    return rationalization_prompt(sku_totals(df), digest_rows(df), token_budget)
 
-Format:
-- List insights as bullet points per SKU.
-- End with a summary paragraph on portfolio health.
-"""
-    return prompt
+def stream_rationalization_prompt(thresholds=None, path=None, batch_rows=data_access.STREAM_BATCH_ROWS):
+    """generate_rationalization_prompt over the history in fixed-size batches, for data larger than memory."""
+    totals, digest = None, None
+    with span('sku.stream', batch_rows=batch_rows):
+        for batch in data_access.iter_batches(SKU_COLUMNS, path, batch_rows):
+            batch = classify_batch(batch, thresholds)
+            totals = data_access.merge_partials(totals, sku_totals(batch))
+            rows = digest_rows(batch)
+            digest = rows if digest is None else digest_rows(pd.concat([digest, rows], ignore_index=True))
+    return rationalization_prompt(totals, digest)
 
 # STEP 5: Get Insight from TinyLLaMA
 def get_llm_insight(prompt):
-    response = requests.post(
-        'http://localhost:11434/api/generate',
-        json={
-            "model": "tinyllama",
-            "prompt": prompt,
-            "stream": False
-        }
-    )
-    return response.json()['response'].strip() 
+    return generate(prompt)
 
 # ✅ FUNCTION to call from LangGraph
-def get_sku_summary():
-    prompt = generate_rationalization_prompt(df)
+def get_sku_summary(stream=False, data=None, thresholds=None):
+    if data is None and data_access.should_stream():
+        prompt = stream_rationalization_prompt(thresholds)
+    else:
+        analyzed = default_analyzer.analyze(data, thresholds=thresholds)
+        with span('sku.prompt'):
+            prompt = generate_rationalization_prompt(analyzed)
+    if stream:
+        return generate_stream(prompt)
     return get_llm_insight(prompt)
-    
\ No newline at end of file
+
+# STEP 6: Per-SKU insights for discontinue candidates, sent as one LLM batch
+SKU_ITEM_LIMIT = 25
+
+def _discontinue_extremes(df, limit):
+    discontinue = df[df['SKU Recommendation'] == '❌ Discontinue']
+    n = len(discontinue) if limit is None else limit
+    return discontinue.iloc[extreme_rows(discontinue, 'Profit Margin', n, largest=False)]
+
+def discontinue_candidates(data=None, thresholds=None, limit=SKU_ITEM_LIMIT):
+    """Discontinue SKUs with the lowest profit margin first, at most ``limit`` of them (all if None)."""
+    if data is None and data_access.should_stream():
+        # Keep each batch's worst SKUs only, so memory stays bounded by batch size + limit
+        kept = None
+        for batch in data_access.iter_batches(SKU_COLUMNS):
+            batch = classify_batch(batch, thresholds)
+            worst = _discontinue_extremes(batch, limit)
+            kept = worst if kept is None else _discontinue_extremes(pd.concat([kept, worst], ignore_index=True), limit)
+        return kept.reset_index(drop=True)
+    df = default_analyzer.analyze(data, thresholds=thresholds)
+    return _discontinue_extremes(df, limit).reset_index(drop=True)
+
+def sku_item_prompt(row):
+    return f"""
+You are a supply chain strategy expert. SKU {row['SKU']} ({row['Product type']}) is flagged for discontinuation.
+
+📊 Metrics:
+- Profit Margin {row['Profit Margin']:.2f}, Sales Velocity {row['Sales Velocity']:.2f}, Defect rates {row['Defect rates']:.2f}
+- Revenue generated {row['Revenue generated']:.2f}, Number of products sold {row['Number of products sold']:.0f}, Stock levels {row['Stock levels']:.0f}
+
+In 2-3 bullet points, explain why this SKU underperforms and whether to discontinue it, bundle it or fix it."""
+
+def get_sku_item_insights(data=None, thresholds=None, limit=SKU_ITEM_LIMIT, on_result=None):
+    """One LLM insight per discontinue candidate; returns the candidates with an 'Insight' column.
+
+    ``on_result(sku, text, error)`` receives each insight as it arrives; failed
+    prompts leave the SKU's insight as None.
+    """
+    candidates = discontinue_candidates(data, thresholds, limit)
+    prompts = [sku_item_prompt(row) for _, row in candidates.iterrows()]
+    report = None
+    if on_result is not None:
+        report = lambda position, text, error: on_result(candidates['SKU'].iloc[position], text, error)
+    candidates['Insight'] = generate_batch(prompts, on_result=report)
+    return candidates
+
+# === Benchmark: vectorized vs row-wise classification ===
+def synthetic_sku_metrics(n_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    metrics = pd.DataFrame({
+        'Profit Margin': rng.uniform(-0.2, 0.6, n_rows),
+        'Sales Velocity': rng.exponential(1.0, n_rows),
+        'Defect rates': rng.uniform(0, 5, n_rows),
+    })
+    # Exercise the rule boundaries and missing values explicitly
+    edges = list(SKU_THRESHOLDS.values())
+    for column in metrics.columns:
+        picks = rng.choice(n_rows, size=min(n_rows, 1000), replace=False)
+        metrics.loc[picks, column] = rng.choice(edges + [np.nan], size=len(picks))
+    return metrics
+
+def benchmark_classification(n_rows=1_000_000, seed=0):
+    metrics = synthetic_sku_metrics(n_rows, seed)
+
+    start = time.perf_counter()
+    vectorized = classify_skus(metrics)
+    vectorized_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    row_wise = metrics.apply(classify_sku, axis=1)
+    row_wise_s = time.perf_counter() - start
+
+    mismatches = int((np.asarray(vectorized, dtype=object) != row_wise.to_numpy(dtype=object)).sum())
+    return {
+        'rows': n_rows,
+        'row_wise_s': round(row_wise_s, 3),
+        'vectorized_s': round(vectorized_s, 4),
+        'speedup': round(row_wise_s / vectorized_s, 1),
+        'mismatches': mismatches,
+    }
+
+if __name__ == "__main__":
+    import json
+    import sys
+    print(json.dumps(benchmark_classification(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)))
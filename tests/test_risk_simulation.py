@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import data_access
+import risk_simulation
+
+
+@pytest.fixture(scope='module')
+def history():
+    return data_access.load_supply_chain_data(columns=risk_simulation.RISK_COLUMNS)
+
+
+@pytest.mark.parametrize('demand_change', [-50, 0, 50])
+def test_every_trial_lands_in_the_histogram(history, demand_change):
+    model = risk_simulation.fit_risk_model(history, demand_change)
+    part = risk_simulation._simulate_chunk(model, np.random.SeedSequence(7), 200_000)
+    assert part['counts'].sum() == part['trials']
+    assert model['histogram_range'][0] <= part['min'] and part['max'] <= model['histogram_range'][1]
+
+
+def test_early_deliveries_stay_in_range():
+    # Half the trials draw a lead time 30 days early, lifting sales 50% above history
+    history = pd.DataFrame({
+        'Product type': ['a', 'a'],
+        'Number of products sold': [100, 100],
+        'Revenue generated': [1000.0, 1000.0],
+        'Lead times': [0, 60],
+        'Manufacturing lead time': [0, 0],
+        'Shipping costs': [5.0, 5.0],
+    })
+    model = risk_simulation.fit_risk_model(history, 50)
+    part = risk_simulation._simulate_chunk(model, np.random.SeedSequence(0), 10_000)
+    assert part['max'] == pytest.approx(1.5 * 1.5 * 2000 - 10)
+    assert part['counts'].sum() == part['trials']
+
+
+def test_plot_histogram_keeps_every_trial(history):
+    result = risk_simulation.run_monte_carlo(120_000, 50, workers=1, df=history)
+    assert sum(result['histogram']['count']) == result['trials']
+
+
+def test_no_demand_change_is_centred_on_base(history):
+    result = risk_simulation.run_monte_carlo(200_000, 0, workers=1, df=history)
+    assert result['expected_revenue'] == pytest.approx(result['base_revenue'], rel=0.005)
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+import data_access
+import risk_simulation
+import scenario_cube
+import scenario_planning
+import sku_rationalization
+
+
+@pytest.fixture(scope='module')
+def in_memory():
+    # Reference results from the whole history, computed before streaming is forced
+    return {
+        'scenario_prompt': scenario_planning.generate_prompt_from_data(
+            scenario_planning.scenario_label(-15),
+            scenario_planning.load_supply_chain_data(scenario_planning.SCENARIO_SEGMENTS), -15,
+        ),
+        'sku_prompt': sku_rationalization.generate_rationalization_prompt(sku_rationalization.default_analyzer.analyze()),
+        'cube': scenario_cube.get_scenario_cube().breakdown(-15, 'Carrier'),
+        'risk_model': risk_simulation.fit_risk_model(
+            data_access.load_supply_chain_data(columns=risk_simulation.RISK_COLUMNS), 10
+        ),
+    }
+
+
+@pytest.fixture(autouse=True)
+def echo_prompts(monkeypatch):
+    # The prompt stands in for the LLM's answer, so summaries can be compared without a server
+    monkeypatch.setattr(scenario_planning, 'get_llm_insight', lambda prompt: prompt)
+    monkeypatch.setattr(sku_rationalization, 'get_llm_insight', lambda prompt: prompt)
+
+
+@pytest.fixture
+def streaming(monkeypatch, in_memory):
+    def no_full_read(*args, **kwargs):
+        raise AssertionError("history was read whole while streaming")
+
+    iter_batches = data_access.iter_batches
+    monkeypatch.setattr(data_access, 'STREAM_THRESHOLD_BYTES', 0)
+    monkeypatch.setattr(data_access, '_read', no_full_read)
+    monkeypatch.setattr(data_access, '_cache', {})
+    # Small batches so every partial is merged many times
+    monkeypatch.setattr(data_access, 'iter_batches', lambda columns=None, path=None, batch_rows=None: iter_batches(columns, path, 7))
+    monkeypatch.setattr(scenario_cube, '_cubes', {})
+    sku_rationalization.default_analyzer.clear()
+
+
+def test_scenario_summary_streams(in_memory, streaming):
+    assert scenario_planning.get_scenario_summary(-15) == in_memory['scenario_prompt']
+
+
+def test_sku_summary_streams(in_memory, streaming):
+    assert sku_rationalization.get_sku_summary() == in_memory['sku_prompt']
+
+
+def test_scenario_cube_streams(in_memory, streaming):
+    streamed = scenario_cube.get_scenario_cube().breakdown(-15, 'Carrier')
+    assert list(streamed['Carrier']) == list(in_memory['cube']['Carrier'])
+    assert np.allclose(streamed.drop(columns='Carrier'), in_memory['cube'].drop(columns='Carrier'))
+
+
+def test_risk_model_streams(in_memory, streaming):
+    streamed = risk_simulation.stream_risk_model(10)
+    for key in ('revenue', 'shipping_total', 'demand_sigma', 'lead_time_median', 'lateness_offset',
+                'shipping_log_mean', 'shipping_log_sigma', 'histogram_range', 'base_revenue'):
+        assert np.allclose(streamed[key], in_memory['risk_model'][key]), key
+    result = risk_simulation.run_monte_carlo(20_000, 10, workers=1)
+    assert sum(result['histogram']['count']) == result['trials']